@@ -1,53 +1,72 @@
+from functools import partial
+
 import streamlit as st
-import pandas as pd
 import matplotlib.pyplot as plt
 
-# Allowed HS2 codes
-need_hs = ['04', '06', '07', '08', '09', '10', '11', '12', '13', '14', '15', '17', '18', '19', '20',
-           '21', '22', '23', '25', '26', '27', '28', '29', '30', '31', '32', '33', '34', '35', '36',
-           '37', '38', '39', '40']
+import config
+import countries
+import instrument
+import rollup
+import shared_data
+import trade_data
+import table_view
+import trade_explorer
+import trade_export
 
-# Load and cache data
+# Allowed HS2 codes
+need_hs = config.NEED_HS
+
+# Load data once per process. The frame and index are read-only memory maps of the copy
+# published under trade_data/_shared, so every worker process shares the same pages and a
+# cache hit hands out the mapped frame itself rather than a copy. The key changes whenever
+# the dataset is rebuilt, which moves the app to the new build.
+@st.cache_resource(max_entries=8)
+def load_data(dataset_key, exporters, importers):
+    return trade_explorer.load_shared(config.DATASET_PATH, need_hs, exporters, importers)
+
+# HS2/HS6 description search index, loaded once per dataset selection
+@st.cache_resource(max_entries=8)
+def load_search(dataset_key, _lookups):
+    return trade_explorer.load_search(config.DATASET_PATH, _lookups)
+
+# Exporters and importers present in the dataset, with their names
 @st.cache_data
-def load_data():
-    df = pd.read_csv("filtered_data.csv")
-    df.columns = df.columns.str.strip()
-
-    # Fix HS6 formatting
-    if 'HS6' in df.columns:
-        df['HS6'] = df['HS6'].astype(str).apply(lambda x: '0' + x if len(x) == 5 else x)
-
-    # Drop unwanted columns
-    df = df.drop(columns=[col for col in ['exporter', 'importer', 'HS6_display'] if col in df.columns], errors='ignore')
-
-    # Filter only allowed HS2
-    df = df[df['HS2'].astype(str).isin(need_hs)]
-
-    # Prepare HS2 display
-    hs2_with_desc = df[['HS2', 'HS2_desc']].drop_duplicates().dropna()
-    hs2_display = [f"{row['HS2']} - {row['HS2_desc']}" for _, row in hs2_with_desc.iterrows()]
-    hs2_mapping = dict(zip(hs2_display, hs2_with_desc['HS2']))
-
-    return {
-        "data": df,
-        "year": sorted(df['year'].dropna().unique()),
-        "hs2_display": hs2_display,
-        "hs2_mapping": hs2_mapping,
-    }
-
-# Format numbers with commas
-def format_number(num):
-    try:
-        return f"{int(num):,}"
-    except:
-        return num
+def load_countries(build_key):
+    pairs = rollup.pairs(config.DATASET_PATH)
+    return sorted(pairs['exporter'].unique().tolist()), sorted(pairs['importer'].unique().tolist()), countries.load_names()
+
+def country_index(codes, default):
+    return codes.index(default) if default in codes else 0
+
+# Trade flow: one exporter and one importer, or "All" on one side (e.g. China to all, all to USA)
+exporter_codes, importer_codes, country_names = load_countries(shared_data.build_key(config.DATASET_PATH))
+st.sidebar.header("🌍 Trade Flow")
+exporter_options = exporter_codes + [countries.ALL]
+importer_options = importer_codes + [countries.ALL]
+exporter = st.sidebar.selectbox("Exporter", exporter_options, index=country_index(exporter_options, config.EXPORTER),
+                                format_func=lambda code: countries.label(code, country_names))
+importer = st.sidebar.selectbox("Importer", importer_options, index=country_index(importer_options, config.IMPORTER),
+                                format_func=lambda code: countries.label(code, country_names))
 
 # UI Title
-st.title("📊 Export Data From China-USA")
+st.title(f"📊 Export Data From {countries.describe(exporter, importer, country_names)}")
+instrument.streamlit_start('Trade_app')
+
+if exporter == countries.ALL and importer == countries.ALL:
+    st.warning("Select an exporter or an importer.")
+    instrument.streamlit_panel()
+    st.stop()
+exporters = None if exporter == countries.ALL else [exporter]
+importers = None if importer == countries.ALL else [importer]
 
 # Load data
-options = load_data()
+with instrument.stage('load_data (cached)') as timing:
+    dataset_key = shared_data.dataset_key(config.DATASET_PATH, need_hs, exporters, importers)
+    options = load_data(dataset_key, exporters, importers)
+    timing.rows_out = len(options['data'])
 df = options['data']
+lookups = options['lookups']
+index = options['index']
 
 # Sidebar filters
 st.sidebar.header("🔎 Filters")
@@ -55,110 +74,97 @@ selected_years = st.sidebar.multiselect("Select Years", options['year'])
 selected_hs2_disp = st.sidebar.multiselect("Select HS2 Codes", options['hs2_display'])
 selected_hs2 = [options['hs2_mapping'][d] for d in selected_hs2_disp]
 
-# Filter HS6 options based on selected HS2
-filtered_temp = df[df['HS2'].isin(selected_hs2)] if selected_hs2 else df
-hs6_display_list = sorted(filtered_temp[['HS6', 'HS6_desc']].drop_duplicates()
-                          .apply(lambda row: f"{row['HS6']} - {row['HS6_desc'][:30]}...", axis=1).tolist())
-selected_hs6_disp = st.sidebar.multiselect("Select HS6 Codes", hs6_display_list)
-selected_hs6 = [entry.split(' - ')[0] for entry in selected_hs6_disp]
+# HS6 search: the typed words are looked up in the description index built at ingest time,
+# and only the ranked matches (plus the codes already picked) become multiselect options.
+# With no query, the codes under the selected HS2 chapters are listed.
+query = st.sidebar.text_input("Search HS6 products", placeholder="e.g. cotton shirt or 6109")
+with instrument.stage('hs6_search') as timing:
+    search = load_search(dataset_key, lookups)
+    hs6_present = [code for code in index.positions['HS6'] if not selected_hs2 or code[:2] in selected_hs2]
+    if query.strip():
+        hs6_matches = [code for code, _ in search.search(query, 'HS6', hs6_present)]
+    else:
+        hs6_matches = sorted(hs6_present) if selected_hs2 else []
+    timing.rows_out = len(hs6_matches)
+hs6_picked = st.session_state.get('selected_hs6', [])
+selected_hs6 = st.sidebar.multiselect("Select HS6 Codes", list(dict.fromkeys(hs6_picked + hs6_matches)),
+                                      key='selected_hs6', format_func=lambda code: f"{code} - {lookups['HS6'].get(code, '')}")
+if query.strip():
+    st.sidebar.caption(f"{len(hs6_matches)} matching products" if hs6_matches else "No matching products")
 
 # Sorting options
 st.sidebar.subheader("📈 Sort Options")
 sort_column = st.sidebar.selectbox("Sort By", ['value(thousands USD)', 'quantity(in metric tons)'])
-sort_order = st.sidebar.radio("Select Type", ['All Data', 'Top N (nlargest)', 'Bottom N (nsmallest)'])
+sort_order = st.sidebar.radio("Select Type", trade_explorer.SORT_ORDERS)
 top_n = st.sidebar.number_input("Number of records", min_value=1, max_value=1000, value=10, step=1)
 
 # Function to filter and sort
-def get_filtered_data():
-    filtered_df = df.copy()
-
-    if selected_years:
-        filtered_df = filtered_df[filtered_df['year'].isin(selected_years)]
-    if selected_hs2:
-        filtered_df = filtered_df[filtered_df['HS2'].isin(selected_hs2)]
-    if selected_hs6:
-        filtered_df = filtered_df[filtered_df['HS6'].isin(selected_hs6)]
-
-    # Convert to numeric
-    filtered_df['quantity(in metric tons)'] = pd.to_numeric(filtered_df['quantity(in metric tons)'], errors='coerce')
-    filtered_df['value(thousands USD)'] = pd.to_numeric(filtered_df['value(thousands USD)'], errors='coerce')
-
-    # Sort based on HS2 totals
-    if sort_order == 'Top N (nlargest)':
-        top_hs2 = (
-            filtered_df.groupby('HS2')['value(thousands USD)']
-            .sum()
-            .sort_values(ascending=False)
-            .head(top_n)
-            .index
-        )
-        filtered_df = filtered_df[filtered_df['HS2'].isin(top_hs2)]
-
-    elif sort_order == 'Bottom N (nsmallest)':
-        bottom_hs2 = (
-            filtered_df.groupby('HS2')['value(thousands USD)']
-            .sum()
-            .sort_values(ascending=True)
-            .head(top_n)
-            .index
-        )
-        filtered_df = filtered_df[filtered_df['HS2'].isin(bottom_hs2)]
+def get_filtered_data(selected_years, selected_hs2, selected_hs6, sort_order, top_n):
+    return trade_explorer.filter_data(options, selected_years, selected_hs2, selected_hs6, sort_order, top_n)
 
-    return filtered_df
+# Build the download file for a result set chunk by chunk, with raw numeric values
+def export_data(filtered_df, export_format):
+    return trade_explorer.export_data(filtered_df, lookups, export_format)
 
 # Button: Show Filtered Data
-show_filtered = st.button("🔍 Show Filtered Data")
+# The filters in effect are captured on click, so paging through results keeps showing them
+if st.button("🔍 Show Filtered Data"):
+    st.session_state.applied_filters = (selected_years, selected_hs2, selected_hs6, sort_order, top_n)
+applied_filters = st.session_state.get('applied_filters')
+show_filtered = applied_filters is not None
 
 # Show preview (if not showing filtered data)
 if not show_filtered:
     st.markdown("### 📋 Preview (Top 10 Rows)")
-    preview_df = df.copy().head(10)
-    preview_df['quantity(in metric tons)'] = preview_df['quantity(in metric tons)'].apply(format_number)
-    preview_df['value(thousands USD)'] = preview_df['value(thousands USD)'].apply(format_number)
+    with instrument.stage('format_preview', rows_in=10):
+        preview_df = table_view.format_numbers(trade_data.add_descriptions(df.head(10), lookups))
     st.dataframe(preview_df)
 
 # Show Filtered Data
 if show_filtered:
-    filtered_df = get_filtered_data()
+    filtered_df, hs2_totals = get_filtered_data(*applied_filters)
+    applied_sort_order = applied_filters[3]
 
     if not filtered_df.empty:
-        # Convert to numeric again
-        filtered_df['quantity(in metric tons)'] = pd.to_numeric(filtered_df['quantity(in metric tons)'], errors='coerce')
-        filtered_df['value(thousands USD)'] = pd.to_numeric(filtered_df['value(thousands USD)'], errors='coerce')
-
         # HS2 Summary if sorted by top/bottom
-        if sort_order in ['Top N (nlargest)', 'Bottom N (nsmallest)']:
-            summary = (
-                filtered_df.groupby(['HS2', 'HS2_desc'])
-                .agg({
-                    'value(thousands USD)': 'sum',
-                    'quantity(in metric tons)': 'sum'
-                })
-                .reset_index()
-            )
+        if applied_sort_order in ['Top N (nlargest)', 'Bottom N (nsmallest)']:
+            summary = hs2_totals.reset_index()
+            summary['HS2_desc'] = summary['HS2'].map(lookups['HS2'])
             summary['Total Value (Million USD)'] = (summary['value(thousands USD)'] / 1000).round(2)
             summary['Total Quantity (Metric Tons)'] = summary['quantity(in metric tons)'].astype(int)
             summary = summary[['HS2', 'HS2_desc', 'Total Value (Million USD)', 'Total Quantity (Metric Tons)']]
-            summary = summary.sort_values(by='Total Value (Million USD)', ascending=(sort_order == 'Bottom N (nsmallest)'))
+            summary = summary.sort_values(by='Total Value (Million USD)', ascending=(applied_sort_order == 'Bottom N (nsmallest)'))
 
             st.markdown("### 📊 Top HS2 Summary")
             st.dataframe(summary)
 
         # Overall Summary
         st.markdown("### 📦 Overall Summary")
-        st.markdown(f"**Total Quantity (Metric Tons):** `{filtered_df['quantity(in metric tons)'].sum():,.0f}`")
-        st.markdown(f"**Total Value (Thousands USD):** `{filtered_df['value(thousands USD)'].sum():,.0f}`")
-
-        # Format for display
-        filtered_df['quantity(in metric tons)'] = filtered_df['quantity(in metric tons)'].apply(format_number)
-        filtered_df['value(thousands USD)'] = filtered_df['value(thousands USD)'].apply(format_number)
+        st.markdown(f"**Total Quantity (Metric Tons):** `{hs2_totals['quantity(in metric tons)'].sum():,.0f}`")
+        st.markdown(f"**Total Value (Thousands USD):** `{hs2_totals['value(thousands USD)'].sum():,.0f}`")
 
-        # Data Table
+        # Data Table: only the visible page gets descriptions and number formatting
         st.markdown(f"### 📄 Filtered Data ({len(filtered_df)} rows)")
-        st.dataframe(filtered_df.head(100))
-
-        # Download
-        st.download_button("📥 Download CSV", filtered_df.to_csv(index=False), file_name="filtered_data_filtered.csv")
+        page_col, size_col = st.columns(2)
+        page_size = size_col.selectbox("Rows per page", table_view.PAGE_SIZES)
+        pages = table_view.page_count(filtered_df, page_size)
+        page = page_col.number_input(f"Page (of {pages})", min_value=1, max_value=pages, value=1, step=1)
+        with instrument.stage('format_page', rows_in=len(filtered_df)) as timing:
+            page_df = table_view.format_numbers(
+                trade_data.add_descriptions(table_view.paginate(filtered_df, page, page_size), lookups))
+            timing.rows_out = len(page_df)
+        st.dataframe(page_df)
+
+        # Download: the file is only written when the button is clicked, off the script thread
+        export_format = st.selectbox("Download format", list(trade_export.FORMATS))
+        st.download_button(
+            "📥 Download",
+            partial(export_data, filtered_df, export_format),
+            file_name=trade_export.file_name("filtered_data_filtered", export_format),
+            mime=trade_export.mime_type(export_format),
+        )
 
     else:
         st.warning("No data found for the selected filters.")
+
+instrument.streamlit_panel()
@@ -1,39 +1,67 @@
+from functools import partial
+
 import streamlit as st
-import pandas as pd
-import pymysql
-
-# MySQL connection
-def get_connection():
-    return pymysql.connect(
-        host='127.0.0.1',
-        user='root',
-        password='1234',
-        database='export_data',
-        charset='utf8mb4'
-    )
+
+import config
+import countries
+import db
+import instrument
+import trade_export
+
+# MySQL connection pool, shared by every session of this server process
+@st.cache_resource
+def get_pool():
+    return db.create_pool()
+
+# Query results shared across sessions, keyed by the normalized year/HS2 selection
+@st.cache_resource
+def get_query_cache():
+    return db.QueryCache()
 
 # Load filter options
 @st.cache_data
 def get_filter_options():
-    conn = get_connection()
-    df = pd.read_sql("SELECT DISTINCT year, HS2, HS2_desc, exporter, importer FROM filtered_export_data", conn)
-    conn.close()
+    years, hs2_with_desc = db.fetch_filter_options(get_pool())
 
-    hs2_with_desc = df[['HS2', 'HS2_desc']].drop_duplicates().dropna()
-    hs2_display = [f"{row['HS2']} - {row['HS2_desc']}" for _, row in hs2_with_desc.iterrows()]
+    hs2_display = [f"{code} - {desc}" for code, desc in zip(hs2_with_desc['HS2'], hs2_with_desc['HS2_desc'])]
     hs2_mapping = dict(zip(hs2_display, hs2_with_desc['HS2']))
 
+    pairs = db.fetch_country_pairs(get_pool())
     return {
-        "year": sorted(df['year'].dropna().unique()),
+        "year": years['year'].tolist(),
         "hs2_display": hs2_display,
         "hs2_mapping": hs2_mapping,
+        "exporters": sorted(pairs['exporter'].astype(int).unique().tolist()),
+        "importers": sorted(pairs['importer'].astype(int).unique().tolist()),
+        "country_names": countries.load_names(),
     }
 
+def country_index(codes, default):
+    return codes.index(default) if default in codes else 0
+
 # Main UI
-st.title("📊 Export Data From China-USA")
+instrument.streamlit_start('app')
+
+# Clear cached options and results after the table has been reloaded
+if st.sidebar.button("🔄 Reload data"):
+    get_filter_options.clear()
+    get_query_cache().invalidate()
 
 # Load filter options
-options = get_filter_options()
+with instrument.stage('filter_options (cached)'):
+    options = get_filter_options()
+
+# Trade flow: a country pair, or "All" on one side (e.g. China to all, all to USA)
+names = options['country_names']
+exporter_options = options['exporters'] + [countries.ALL]
+importer_options = options['importers'] + [countries.ALL]
+exporter = st.sidebar.selectbox("Exporter", exporter_options, index=country_index(exporter_options, config.EXPORTER),
+                                format_func=lambda code: countries.label(code, names))
+importer = st.sidebar.selectbox("Importer", importer_options, index=country_index(importer_options, config.IMPORTER),
+                                format_func=lambda code: countries.label(code, names))
+selected_exporters = [] if exporter == countries.ALL else [exporter]
+selected_importers = [] if importer == countries.ALL else [importer]
+st.title(f"📊 Export Data From {countries.describe(exporter, importer, names)}")
 
 # Multi-select filters
 selected_years = st.multiselect("Select Years", options['year'])
@@ -43,47 +71,59 @@ selected_hs2_disp = st.multiselect("Select HS2 Codes", options['hs2_display'])
 selected_hs2 = [options['hs2_mapping'][d] for d in selected_hs2_disp]
 
 # Apply filters
+# The selection is kept in session_state so paging and the download format picker can rerun the script
 if st.button("🔍 Show Filtered Data"):
-    where_clauses = []
-    values = []
-
-    if selected_years:
-        placeholders = ','.join(['%s'] * len(selected_years))
-        where_clauses.append(f"year IN ({placeholders})")
-        values.extend(selected_years)
+    st.session_state.applied_filters = (selected_years, selected_hs2, selected_exporters, selected_importers)
+    st.session_state.page_keys = [None]
 
-    if selected_hs2:
-        placeholders = ','.join(['%s'] * len(selected_hs2))
-        where_clauses.append(f"HS2 IN ({placeholders})")
-        values.extend(selected_hs2)
+if 'applied_filters' in st.session_state:
+    pool, cache = get_pool(), get_query_cache()
+    applied_years, applied_hs2, applied_exporters, applied_importers = st.session_state.applied_filters
+    countries_filter = {'exporters': applied_exporters, 'importers': applied_importers}
 
-    where_sql = " AND ".join(where_clauses)
-    query = "SELECT * FROM filtered_export_data"
-    if where_sql:
-        query += " WHERE " + where_sql
-
-    conn = get_connection()
-    df = pd.read_sql(query, conn, params=values)
-    conn.close()
-
-    if not df.empty:
-        # Convert to numeric for summary stats
-        df['quantity(in metric tons)'] = pd.to_numeric(df['quantity(in metric tons)'], errors='coerce')
-        df['value(thousands USD)'] = pd.to_numeric(df['value(thousands USD)'], errors='coerce')
+    # Totals are summed by the database; only the visible page is transferred
+    with instrument.stage('totals') as timing:
+        totals = db.fetch_totals(pool, cache, applied_years, applied_hs2, **countries_filter)
+        timing.rows_out = totals['rows']
 
+    if totals['rows']:
         # Show summary stats
-        total_quantity = df['quantity(in metric tons)'].sum()
-        total_value = df['value(thousands USD)'].sum()
-
         st.markdown("### 📦 Summary")
-        st.markdown(f"**Total Traded Quantity (Metric Tons):** `{total_quantity:,.2f}`")
-        st.markdown(f"**Total Value (Thousands USD):** `{total_value:,.2f}`")
+        st.markdown(f"**Total Traded Quantity (Metric Tons):** `{totals['quantity']:,.2f}`")
+        st.markdown(f"**Total Value (Thousands USD):** `{totals['value']:,.2f}`")
 
-        # Show filtered data
-        st.markdown(f"### Filtered Data ({len(df)} rows)")
-        st.dataframe(df.head(100))
+        # Keyset pagination: page_keys holds the last row key before each visited page
+        page_keys = st.session_state.page_keys
+        with instrument.stage('page') as timing:
+            page = db.fetch_page(pool, cache, applied_years, applied_hs2, after=page_keys[-1], **countries_filter)
+            timing.rows_out = len(page)
+        first_row = (len(page_keys) - 1) * db.PAGE_SIZE + 1
 
-        # Download button
-        st.download_button("📥 Download CSV", df.to_csv(index=False), file_name="filtered_data.csv")
+        # Show filtered data
+        st.markdown(f"### Filtered Data ({totals['rows']} rows)")
+        st.caption(f"Rows {first_row:,}–{first_row + len(page) - 1:,}")
+        st.dataframe(page)
+
+        prev_col, next_col = st.columns(2)
+        # st.rerun() ends the script here, so the run's timings are closed first
+        if prev_col.button("⬅️ Previous page", disabled=len(page_keys) == 1):
+            page_keys.pop()
+            instrument.finish_run()
+            st.rerun()
+        if next_col.button("Next page ➡️", disabled=first_row + len(page) > totals['rows']):
+            page_keys.append(db.page_key(page))
+            instrument.finish_run()
+            st.rerun()
+
+        # Download button: pages are streamed from the database into the file when clicked
+        export_format = st.selectbox("Download format", list(trade_export.FORMATS))
+        st.download_button(
+            "📥 Download",
+            partial(db.export_pages, pool, applied_years, applied_hs2, export_format, **countries_filter),
+            file_name=trade_export.file_name("filtered_data", export_format),
+            mime=trade_export.mime_type(export_format),
+        )
     else:
         st.warning("No data found for the selected filters.")
+
+instrument.streamlit_panel()
@@ -0,0 +1,287 @@
+import argparse
+import csv
+from dataclasses import dataclass
+from itertools import islice, product
+
+import numpy as np
+import pandas as pd
+
+import martingale
+
+# Outcome labels, as entered in simulator.py (Red/Green) and copilot.py (big/small)
+FIRST = ('red', 'big')
+SECOND = ('green', 'small')
+CHOICES = ['Red', 'Green', 'big', 'small', 'Both']
+
+CHUNK_SIZE = 65_536
+MAX_POINTS = 2_000
+
+
+# Outcome labels from an open text file: one per line, or the `column` of a CSV with a header
+def read_outcomes(handle, column=None):
+    if column is None:
+        for line in handle:
+            if line.strip():
+                yield line.strip()
+    else:
+        for row in csv.DictReader(handle):
+            yield row[column].strip()
+
+
+# True for Red/big, False for Green/small; unknown labels are skipped
+def encode_outcomes(labels):
+    for label in labels:
+        label = label.lower()
+        if label in FIRST:
+            yield True
+        elif label in SECOND:
+            yield False
+
+
+def batched(flags, size=CHUNK_SIZE):
+    flags = iter(flags)
+    while True:
+        chunk = np.fromiter(islice(flags, size), dtype=bool)
+        if chunk.size == 0:
+            return
+        yield chunk
+
+
+# Keeps at most `max_points` samples of a growing series per strategy.
+# When the buffer fills, every other sample is dropped and the sampling stride doubles,
+# so a curve of any length is held in constant memory with evenly spaced points.
+class Downsampler:
+    def __init__(self, n_series, max_points=MAX_POINTS):
+        self.max_points = max_points - max_points % 2
+        self.steps = np.empty(self.max_points, dtype=np.int64)
+        self.values = np.empty((self.max_points, n_series))
+        self.count = 0
+        self.stride = 1
+
+    def add(self, step, values):
+        self.extend(np.array([step]), np.asarray(values)[None])
+
+    # Add samples for increasing `steps` (one row of `values` each), as repeated add() calls would
+    def extend(self, steps, values):
+        while len(steps):
+            keep = steps % self.stride == 0
+            steps, values = steps[keep], values[keep]
+            if not len(steps):
+                return
+            if self.count == self.max_points:
+                self.steps[:self.count // 2] = self.steps[:self.count:2]
+                self.values[:self.count // 2] = self.values[:self.count:2]
+                self.count //= 2
+                self.stride *= 2
+                continue
+            take = min(len(steps), self.max_points - self.count)
+            self.steps[self.count:self.count + take] = steps[:take]
+            self.values[self.count:self.count + take] = values[:take]
+            self.count += take
+            steps, values = steps[take:], values[take:]
+
+    def frame(self, columns, last_step=None, last_values=None):
+        steps, values = self.steps[:self.count], self.values[:self.count]
+        if last_step is not None and (self.count == 0 or steps[-1] != last_step):
+            steps = np.append(steps, last_step)
+            values = np.vstack([values, last_values])
+        return pd.DataFrame(values, index=pd.Index(steps, name='Round'), columns=columns)
+
+
+@dataclass
+class BacktestResult:
+    # One row per strategy: its settings and final P&L, sessions, busts and drawdown
+    summary: pd.DataFrame
+    # P&L after each round (downsampled), one column per strategy
+    curves: pd.DataFrame
+
+
+# Every combination of the given settings as a strategy table
+def strategy_grid(wallet=(1000,), starting_bet=(100,), multiplier=(martingale.MULTIPLIER,),
+                  payout=(martingale.PAYOUT,), stop_wins=(4,), reset_on_win=(False,), choice=('Red',)):
+    columns = ['wallet', 'starting_bet', 'multiplier', 'payout', 'stop_wins', 'reset_on_win', 'choice']
+    rows = product(wallet, starting_bet, multiplier, payout, stop_wins, reset_on_win, choice)
+    return pd.DataFrame(list(rows), columns=columns)
+
+
+def strategy_label(row):
+    return (f"{row.choice} x{row.multiplier:g} bet {row.starting_bet:g} stop {row.stop_wins}"
+            f"{'' if row.reset_on_win else ' keep'} wallet {row.wallet:g}")
+
+
+# Bets after 0, 1, 2, ... straight losses, as repeated round(bet * multiplier, 2) gives them.
+# Extended on demand; it stops growing once the bet overflows or settles, as every later bet
+# is then the same.
+class BetLadder:
+    def __init__(self, starting_bet, multiplier):
+        self.multiplier = multiplier
+        self.bets = [starting_bet]
+        self.settled = False
+
+    def __getitem__(self, losses):
+        losses = np.asarray(losses)
+        top = int(losses.max(initial=0))
+        while not self.settled and len(self.bets) <= top:
+            bet = self.bets[-1]
+            following = float(np.round(bet * self.multiplier, 2))
+            self.settled = following == bet or np.isinf(following)
+            self.bets.append(following)
+        bets = np.asarray(self.bets)
+        return bets[np.minimum(losses, len(bets) - 1)]
+
+
+# Replay one outcome sequence through every strategy at once.
+# Each strategy follows the app rules: a win pays round(bet * payout, 2) and resets the bet
+# (copilot.py) or keeps it (simulator.py), a loss multiplies the bet, and "Both" picks a side
+# at random each round. Reaching `stop_wins` banks the session and starts a new one with the
+# starting bet; a strategy that cannot cover its next bet is bust and sits out the rest.
+# `chunks` is an iterable of boolean arrays (True = Red/big), so the log is never held in memory.
+#
+# Rounds are not stepped one by one. A session ends on every stop_wins-th win whatever the
+# cash, so within a chunk each strategy's bets follow from where it was reset last (segment
+# cumsums over the loss flags) and its cash is a running sum of the round results; the
+# strategy is bust from the first round whose bet exceeds the cash before it. Sums run in
+# round order, so the results match a round-by-round replay exactly. Only the state at the
+# end of a chunk (cash, losses since the last reset, wins this session) carries over.
+def backtest(chunks, strategies, max_points=MAX_POINTS, seed=None):
+    n = len(strategies)
+    wallet = strategies['wallet'].to_numpy(float)
+    payout = strategies['payout'].to_numpy(float)
+    stop_wins = strategies['stop_wins'].to_numpy(int)
+    reset_on_win = strategies['reset_on_win'].to_numpy(bool)
+    choice = strategies['choice'].str.lower()
+    both = (choice == 'both').to_numpy()
+    picks_first = choice.isin(FIRST).to_numpy()
+    ladders = [BetLadder(float(bet), float(multiplier)) for bet, multiplier
+               in zip(strategies['starting_bet'].to_numpy(float), strategies['multiplier'].to_numpy(float))]
+
+    rng = np.random.default_rng(seed)
+    cash = wallet.copy()
+    # Losses since the bet was last reset, which fix the current bet
+    losses = np.zeros(n, dtype=np.int64)
+    wins = np.zeros(n, dtype=np.int64)
+    sessions = np.zeros(n, dtype=np.int64)
+    rounds = np.zeros(n, dtype=np.int64)
+    bust = np.zeros(n, dtype=bool)
+    peak = wallet.copy()
+    drawdown = np.zeros(n)
+    curves = Downsampler(n, max_points)
+
+    step = 0
+    curves.add(step, np.zeros(n))
+    for chunk in chunks:
+        size = len(chunk)
+        if bust.all():
+            # Nothing left to play; just count the remaining rounds
+            step += size
+            continue
+        coins = rng.random((size, n)) < 0.5 if both.any() else None
+        # Only the rounds the downsampler can still keep are materialized
+        sampled = np.flatnonzero((step + 1 + np.arange(size)) % curves.stride == 0)
+        pnl = np.empty((len(sampled), n))
+        # Round at which the last strategy still playing went bust
+        last_bust = -1
+        for j in range(n):
+            if bust[j]:
+                pnl[:, j] = cash[j] - wallet[j]
+                continue
+            won = chunk == (coins[:, j] if both[j] else picks_first[j])
+            lost = ~won
+            session_wins = wins[j] + np.cumsum(won)
+            done = won & (session_wins % stop_wins[j] == 0) if stop_wins[j] > 0 else np.ones(size, dtype=bool)
+            reset = done | (won & reset_on_win[j])
+
+            # Losses before each round since the latest reset before it (or since the chunk start)
+            lost_total = np.cumsum(lost)
+            last_reset = np.maximum.accumulate(np.where(reset, np.arange(size), -1))
+            reset_before = np.concatenate(([-1], last_reset[:-1]))
+            offset = np.where(reset_before >= 0, lost_total[np.maximum(reset_before, 0)], -losses[j])
+            streak = lost_total - lost - offset
+            bet = ladders[j][streak]
+
+            result = np.where(won, np.round(bet * payout[j], 2), -bet)
+            balance = np.cumsum(np.concatenate(([cash[j]], result)))
+            broke = np.flatnonzero(bet > balance[:-1])
+            played = broke[0] if len(broke) else size
+            if len(broke):
+                bust[j] = True
+                last_bust = max(last_bust, played)
+
+            balance = balance[:played + 1]
+            cash[j] = balance[-1]
+            rounds[j] += played
+            sessions[j] += done[:played].sum()
+            if played < size:
+                won_so_far = session_wins[played] - won[played]
+                losses[j] = streak[played]
+            else:
+                won_so_far = session_wins[-1]
+                losses[j] = 0 if reset[-1] else streak[-1] + lost[-1]
+            wins[j] = won_so_far % stop_wins[j] if stop_wins[j] > 0 else 0
+            running_peak = np.maximum.accumulate(np.concatenate(([peak[j]], balance[1:])))
+            peak[j] = running_peak[-1]
+            drawdown[j] = max(drawdown[j], (running_peak - balance).max())
+            pnl[:, j] = balance[np.minimum(sampled + 1, played)] - wallet[j]
+
+        # Once every strategy is bust the curves stop, as the round-by-round replay stops there
+        if bust.all():
+            sampled, pnl = sampled[sampled <= last_bust], pnl[sampled <= last_bust]
+        curves.extend(step + 1 + sampled, pnl)
+        step += size
+
+    bet = np.array([ladder[streak] for ladder, streak in zip(ladders, losses)])
+    labels = [strategy_label(row) for row in strategies.itertuples()]
+    summary = strategies.assign(
+        strategy=labels,
+        final_pnl=np.round(cash - wallet, 2),
+        rounds=rounds,
+        sessions=sessions,
+        bust=bust | (bet > cash),
+        max_drawdown=np.round(drawdown, 2),
+    )
+    return BacktestResult(summary=summary, curves=curves.frame(labels, step, cash - wallet))
+
+
+def parse_list(text, kind=float):
+    return [kind(value) for value in text.split(',')]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Backtest martingale strategies over a file of past outcomes (Red/Green or big/small). "
+                    "List options take comma-separated values and every combination is tested.")
+    parser.add_argument('outcomes', help="text file with one outcome per line, or a CSV (see --column)")
+    parser.add_argument('--column', help="CSV column holding the outcomes")
+    parser.add_argument('--wallet', default='1000')
+    parser.add_argument('--starting-bet', default='100')
+    parser.add_argument('--multiplier', default=str(martingale.MULTIPLIER))
+    parser.add_argument('--payout', default=str(martingale.PAYOUT))
+    parser.add_argument('--stop-wins', default='4')
+    parser.add_argument('--choice', default='Red,Green,Both', help=f"any of {', '.join(CHOICES)}")
+    parser.add_argument('--reset-on-win', action='store_true', help="reset to the starting bet after a win (copilot.py)")
+    parser.add_argument('--max-points', type=int, default=MAX_POINTS, help="points kept per equity curve")
+    parser.add_argument('--seed', type=int, default=None, help="seed for the Both choice")
+    parser.add_argument('--curves', default='backtest_curves.csv', help="where to write the equity curves")
+    args = parser.parse_args(argv)
+
+    strategies = strategy_grid(
+        wallet=parse_list(args.wallet),
+        starting_bet=parse_list(args.starting_bet),
+        multiplier=parse_list(args.multiplier),
+        payout=parse_list(args.payout),
+        stop_wins=parse_list(args.stop_wins, int),
+        reset_on_win=[args.reset_on_win],
+        choice=parse_list(args.choice, str),
+    )
+    with open(args.outcomes, newline='', encoding='utf-8') as handle:
+        chunks = batched(encode_outcomes(read_outcomes(handle, args.column)))
+        result = backtest(chunks, strategies, max_points=args.max_points, seed=args.seed)
+
+    result.curves.to_csv(args.curves)
+    columns = ['strategy', 'final_pnl', 'rounds', 'sessions', 'bust', 'max_drawdown']
+    print(result.summary[columns].sort_values('final_pnl', ascending=False).to_string(index=False))
+    print(f"Wrote {args.curves}")
+
+
+if __name__ == '__main__':
+    main()
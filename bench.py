@@ -0,0 +1,413 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import subprocess
+import sys
+import time
+import tracemalloc
+from functools import partial
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+from streamlit.runtime.download_data_util import convert_data_to_bytes_and_infer_mime
+
+import backtest
+import config
+import db
+import ingest
+import martingale
+import shared_data
+import trade_data
+import trade_explorer
+from ledger import RoundLedger
+
+# Peak RSS comes from getrusage, which only exists on Unix; elsewhere it is not recorded
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Benchmark data and results (override with BENCH_DIR / BENCH_HISTORY)
+BENCH_DIR = os.environ.get('BENCH_DIR', '_bench')
+HISTORY_PATH = os.environ.get('BENCH_HISTORY', 'bench_history.json')
+
+SCALES = {'1M': 1_000_000, '10M': 10_000_000, '100M': 100_000_000}
+YEARS = list(range(2017, 2024))
+# BACI-like country codes; the China -> USA pair gets `pair_share` of the rows
+COUNTRIES = np.array([36, 76, 124, 156, 251, 276, 356, 392, 410, 484, 528, 643, 699, 704, 757, 826, 842])
+HS6_PER_HS2 = 60
+
+
+def parse_rows(text):
+    return SCALES.get(text.upper()) or int(float(text))
+
+
+# HS2/HS6 description tables shaped like hs2_codes_corrected.csv and the BACI product codes file
+def write_hs_tables(directory):
+    hs2 = [f"{code:02d}" for code in range(1, 98)]
+    hs2_table = pd.DataFrame({'HS2': hs2, 'Description': [f"Chapter {code} goods" for code in hs2]})
+    hs6 = [f"{code}{item:04d}" for code in hs2 for item in range(10, 10 + HS6_PER_HS2 * 10, 10)]
+    hs6_table = pd.DataFrame({'code': hs6, 'description': [f"Product {code}, synthetic description text" for code in hs6]})
+    hs2_path = os.path.join(directory, 'hs2_codes.csv')
+    hs6_path = os.path.join(directory, 'product_codes.csv')
+    hs2_table.to_csv(hs2_path, index=False)
+    hs6_table.to_csv(hs6_path, index=False)
+    return hs2_path, hs6_path, np.array([int(code) for code in hs6])
+
+
+# Yearly BACI_HS17_Y<year>_V202501.csv files with `rows` rows in total, written in chunks.
+# Unlike the real release, (exporter, importer, product) is not unique within a year, so
+# keyset pages over the SQLite copy can skip tied rows at page boundaries.
+def write_baci_files(directory, rows, hs6, pair_share, seed, chunksize=1_000_000):
+    rng = np.random.default_rng(seed)
+    per_year = rows // len(YEARS)
+    for year in YEARS:
+        path = os.path.join(directory, f"BACI_HS17_Y{year}_V202501.csv")
+        with open(path, 'w', encoding='utf-8', newline='') as handle:
+            handle.write("t,i,j,k,v,q\n")
+            for start in range(0, per_year, chunksize):
+                n = min(chunksize, per_year - start)
+                pair = rng.random(n) < pair_share
+                exporter = np.where(pair, 156, rng.choice(COUNTRIES, n))
+                importer = np.where(pair, 842, rng.choice(COUNTRIES, n))
+                chunk = pd.DataFrame({
+                    't': year,
+                    'i': exporter,
+                    'j': importer,
+                    'k': rng.choice(hs6, n),
+                    'v': np.round(rng.lognormal(3, 2, n), 3),
+                    'q': np.where(rng.random(n) < 0.05, np.nan, np.round(rng.lognormal(2, 2, n), 3)),
+                })
+                chunk.to_csv(handle, header=False, index=False, na_rep='')
+
+
+# Generated inputs are kept between runs, one directory per scale/seed
+def prepare_source(rows, pair_share, seed):
+    directory = os.path.join(BENCH_DIR, f"baci_{rows}_{pair_share}_{seed}")
+    marker = os.path.join(directory, '.complete')
+    hs2_path, hs6_path = os.path.join(directory, 'hs2_codes.csv'), os.path.join(directory, 'product_codes.csv')
+    if not os.path.exists(marker):
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory)
+        hs2_path, hs6_path, hs6 = write_hs_tables(directory)
+        write_baci_files(directory, rows, hs6, pair_share, seed)
+        open(marker, 'w').close()
+    return directory, hs2_path, hs6_path
+
+
+# Runs stages and records wall time, throughput and peak traced memory for each.
+# Timed runs are untraced; with tracing on, one extra run under tracemalloc measures the peak
+# of Python and numpy allocations (not Arrow's own pool, nor worker processes).
+class Bench:
+    def __init__(self, trace_memory=True):
+        self.trace_memory = trace_memory
+        self.stages = {}
+
+    def run(self, name, fn, rows=None, repeat=1):
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = fn()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+
+        peak = None
+        if self.trace_memory:
+            tracemalloc.start()
+            try:
+                fn()
+                peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+
+        count = rows(result) if callable(rows) else rows
+        stage = {'seconds': round(best, 6)}
+        if count is not None:
+            stage['rows'] = int(count)
+            stage['rows_per_sec'] = round(count / max(best, 1e-9), 1)
+        if peak is not None:
+            stage['peak_mb'] = round(peak / 2 ** 20, 2)
+        self.stages[name] = stage
+        rate = f", {stage['rows_per_sec']:,.0f} rows/sec" if 'rows_per_sec' in stage else ''
+        memory = f", peak {stage['peak_mb']:,.1f} MB" if 'peak_mb' in stage else ''
+        print(f"{name:<32} {best:9.3f}s{rate}{memory}")
+        return result
+
+
+def bench_ingest(bench, source, hs2_path, hs6_path, rows, workers):
+    output = os.path.join(BENCH_DIR, 'trade_data')
+    bench.run('ingest_parquet', lambda: ingest.build_dataset(
+        source, hs2_path, hs6_path, output, workers=workers, chunksize=config.CHUNK_SIZE, full=True), rows=rows)
+    # A rerun with unchanged sources only checks the manifest
+    bench.run('ingest_unchanged', lambda: ingest.build_dataset(
+        source, hs2_path, hs6_path, output, workers=workers, chunksize=config.CHUNK_SIZE))
+    csv_output = os.path.join(BENCH_DIR, 'filtered_data.csv')
+    bench.run('ingest_csv', lambda: ingest.build_dataset(
+        source, hs2_path, hs6_path, csv_output, workers=workers, fmt='csv', chunksize=config.CHUNK_SIZE,
+        full=True), rows=rows)
+    return output
+
+
+def bench_explorer(bench, root, repeat):
+    options = bench.run('load_data', lambda: trade_explorer.load_data(root, config.NEED_HS),
+                        rows=lambda result: len(result['data']))
+    # Publishing the memory-mapped copy once, then attaching to it as a new worker would
+    shared = os.path.join(root, shared_data.SHARED_DIR)
+    bench.run('publish_shared', lambda: (shutil.rmtree(shared, ignore_errors=True),
+                                         trade_explorer.load_shared(root, config.NEED_HS)),
+              rows=len(options['data']))
+    bench.run('attach_shared', lambda: trade_explorer.load_shared(root, config.NEED_HS),
+              rows=len(options['data']), repeat=repeat)
+    data = options['data']
+    years = options['year'][-3:]
+    hs2 = list(options['hs2_mapping'].values())[:10]
+    index = options['index']
+
+    # Sidebar typeahead: every synthetic description matches the word, the code prefix a chapter
+    search = bench.run('search_load', lambda: trade_explorer.load_search(root, options['lookups']))
+    hs6_present = list(index.positions['HS6'])
+    bench.run('search_words', lambda: search.search('synthetic descr', 'HS6', hs6_present),
+              rows=len(search.codes), repeat=repeat)
+    bench.run('search_code', lambda: search.search(hs2[0], 'HS6', hs6_present), rows=len(search.codes), repeat=repeat)
+
+    filtered = None
+    for sort_order in trade_explorer.SORT_ORDERS:
+        name = 'filter_' + sort_order.split()[0].lower()
+        filtered, _ = bench.run(name, lambda: trade_explorer.filter_data(options, years, hs2, [], sort_order, 10),
+                                rows=len(data), repeat=repeat)
+    everything, _ = trade_explorer.filter_data(options, [], [], [], 'All Data', 10)
+    for fmt in ['CSV', 'Parquet']:
+        data = bench.run(f"export_{fmt.lower()}",
+                         lambda: download(partial(trade_explorer.export_data, everything, options['lookups'], fmt)),
+                         rows=len(everything))
+        check_download(data, fmt, len(everything))
+    return filtered
+
+
+# Bytes st.download_button serves for a deferred download: the callback's result goes
+# through Streamlit's own converter, which rejects file types it cannot read
+def download(callback):
+    handle = callback()
+    try:
+        return convert_data_to_bytes_and_infer_mime(
+            handle, TypeError(f"st.download_button cannot serve {type(handle).__name__}"))[0]
+    finally:
+        handle.close()
+
+
+# The downloaded file must parse back into every exported row
+def check_download(data, fmt, rows):
+    if fmt == 'Parquet':
+        found = pq.read_metadata(BytesIO(data)).num_rows
+    else:
+        found = len(pd.read_csv(BytesIO(data), compression='gzip' if fmt == 'CSV (gzip)' else None))
+    if found != rows:
+        raise AssertionError(f"{fmt} download holds {found:,} rows, expected {rows:,}")
+
+
+# SQLite copy of filtered_export_data so app.py's queries run without MySQL
+def build_sqlite(root, path):
+    if os.path.exists(path):
+        os.remove(path)
+    conn = sqlite3.connect(path)
+    for chunk in trade_data.open_dataset(root).to_batches(batch_size=500_000):
+        chunk.to_pandas().to_sql(db.TABLE, conn, if_exists='append', index=False)
+    conn.close()
+    pool = db.ConnectionPool(lambda: db.sqlite_connect(path), max_size=4, placeholder='?')
+    db.apply_schema(pool, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'schema.sql'))
+    return pool
+
+
+def bench_queries(bench, root, repeat):
+    pool = bench.run('sqlite_load', lambda: build_sqlite(root, os.path.join(BENCH_DIR, 'export_data.db')))
+    years, hs2 = db.fetch_filter_options(pool)
+    years, hs2 = years['year'].tolist()[-3:], hs2['HS2'].tolist()[:10]
+    total = db.fetch_totals(pool, db.QueryCache(), [], [])['rows']
+
+    bench.run('query_totals', lambda: db.fetch_totals(pool, db.QueryCache(), years, hs2), rows=total, repeat=repeat)
+    first = bench.run('query_first_page', lambda: db.load_page(pool, years, hs2), rows=len, repeat=repeat)
+    if len(first):
+        after = db.page_key(first)
+        bench.run('query_next_page', lambda: db.load_page(pool, years, hs2, after), rows=len, repeat=repeat)
+    bench.run('query_export_pages', lambda: sum(len(page) for page in db.iter_pages(pool, [], [])), rows=lambda n: n)
+    # The app keeps one download callback and calls it for every click; each must hold every row
+    callback = partial(db.export_pages, pool, [], [], 'CSV (gzip)')
+    for name in ['query_download', 'query_download_again']:
+        check_download(bench.run(name, lambda: download(callback), rows=total), 'CSV (gzip)', total)
+    pool.close()
+
+
+# The backtest rules stepped one round at a time for every strategy, as backtest.backtest
+# applied them before it was vectorized; its results must match exactly
+def replay_backtest(chunks, strategies, max_points=backtest.MAX_POINTS, seed=None):
+    n = len(strategies)
+    wallet = strategies['wallet'].to_numpy(float)
+    start_bet = strategies['starting_bet'].to_numpy(float)
+    multiplier = strategies['multiplier'].to_numpy(float)
+    payout = strategies['payout'].to_numpy(float)
+    stop_wins = strategies['stop_wins'].to_numpy(int)
+    reset_on_win = strategies['reset_on_win'].to_numpy(bool)
+    choice = strategies['choice'].str.lower()
+    both = (choice == 'both').to_numpy()
+    picks_first = choice.isin(backtest.FIRST).to_numpy()
+
+    rng = np.random.default_rng(seed)
+    cash, bet, peak = wallet.copy(), start_bet.copy(), wallet.copy()
+    wins, sessions, rounds = (np.zeros(n, dtype=np.int64) for _ in range(3))
+    bust = np.zeros(n, dtype=bool)
+    drawdown = np.zeros(n)
+    curves = backtest.Downsampler(n, max_points)
+    step = 0
+    curves.add(step, np.zeros(n))
+    for chunk in chunks:
+        for i, outcome in enumerate(chunk):
+            if bust.all():
+                step += len(chunk) - i
+                break
+            bust |= ~bust & (bet > cash)
+            playing = ~bust
+            won = np.where(both, rng.random(n) < 0.5, picks_first) == outcome
+            cash += np.where(playing, np.where(won, np.round(bet * payout, 2), -bet), 0)
+            rounds += playing
+            wins += playing & won
+            bet = np.where(playing, np.where(won, np.where(reset_on_win, start_bet, bet), np.round(bet * multiplier, 2)), bet)
+            done = playing & (wins >= stop_wins)
+            sessions += done
+            wins[done] = 0
+            bet[done] = start_bet[done]
+            np.maximum(peak, cash, out=peak)
+            np.maximum(drawdown, peak - cash, out=drawdown)
+            step += 1
+            curves.add(step, cash - wallet)
+
+    labels = [backtest.strategy_label(row) for row in strategies.itertuples()]
+    summary = strategies.assign(strategy=labels, final_pnl=np.round(cash - wallet, 2), rounds=rounds,
+                                sessions=sessions, bust=bust | (bet > cash), max_drawdown=np.round(drawdown, 2))
+    return backtest.BacktestResult(summary=summary, curves=curves.frame(labels, step, cash - wallet))
+
+
+def check_backtest(result, expected):
+    pd.testing.assert_frame_equal(result.summary, expected.summary)
+    pd.testing.assert_frame_equal(result.curves, expected.curves)
+
+
+def bench_simulators(bench, sessions):
+    result = bench.run('simulate_reset', lambda: martingale.simulate(25000, 10, 5, sessions=sessions, seed=0),
+                       rows=lambda result: result.rounds.sum())
+    bench.run('simulate_keep', lambda: martingale.simulate(1000, 100, 4, sessions=sessions, reset_on_win=False, seed=0),
+              rows=lambda result: result.rounds.sum())
+
+    def append_rounds(count=10_000):
+        rounds = RoundLedger({'Round': 'int32', 'Bet': 'float64', 'Result': ['Win', 'Loss'], 'P&L': 'float64'})
+        for number in range(count):
+            rounds.append({'Round': number, 'Bet': 10.0, 'Result': 'Win', 'P&L': 9.8})
+        return count
+
+    bench.run('ledger_appends', append_rounds, rows=lambda count: count)
+
+    # A big wallet keeps most strategies playing through the whole log
+    outcomes = np.random.default_rng(0).random(1_000_000) < 0.5
+    strategies = backtest.strategy_grid(wallet=(1e9,), starting_bet=(1,), multiplier=(1.5, 2), stop_wins=(4,),
+                                        reset_on_win=(False, True), choice=('Red', 'Both'))
+    bench.run('backtest', lambda: backtest.backtest(backtest.batched(outcomes), strategies, seed=0),
+              rows=len(outcomes))
+    # Small chunks carry state across many chunk boundaries; the replay is slow, so it gets a prefix
+    check = list(backtest.batched(outcomes[:50_000], size=4_096))
+    check_backtest(backtest.backtest(check, strategies, max_points=200, seed=1),
+                   replay_backtest(check, strategies, max_points=200, seed=1))
+    return result
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# Append this run to the JSON history and report changes against the last run at the same scale
+def record_run(path, run):
+    history = []
+    if os.path.exists(path):
+        with open(path, encoding='utf-8') as handle:
+            history = json.load(handle)
+    previous = next((old for old in reversed(history) if old['rows'] == run['rows']), None)
+    history.append(run)
+    with open(path + '.tmp', 'w', encoding='utf-8') as handle:
+        json.dump(history, handle, indent=1)
+    os.replace(path + '.tmp', path)
+
+    if previous is not None:
+        print(f"\nChange since {previous['revision'] or 'previous run'} ({previous['timestamp']}):")
+        for name, stage in run['stages'].items():
+            before = previous['stages'].get(name)
+            if before:
+                change = (stage['seconds'] - before['seconds']) / max(before['seconds'], 1e-9)
+                print(f"{name:<32} {change:+8.1%}")
+
+
+# Peak resident memory of this process in MB, or None where it cannot be read
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Reported in bytes on macOS and in kilobytes on Linux
+    return round(peak / (2 ** 20 if sys.platform == 'darwin' else 1024), 1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark ingestion, the trade explorer, app.py queries "
+                                                 "(on SQLite) and the simulators on synthetic BACI data.")
+    parser.add_argument('--rows', default='1M', help="BACI rows to generate: 1M, 10M, 100M or a number")
+    parser.add_argument('--pair-share', type=float, default=0.05, help="share of rows that are China -> USA")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=config.INGEST_WORKERS)
+    parser.add_argument('--repeat', type=int, default=3, help="runs per fast stage (best time is kept)")
+    parser.add_argument('--sessions', type=int, default=100_000, help="Monte Carlo sessions per simulator run")
+    parser.add_argument('--only', nargs='+', choices=['ingest', 'explorer', 'queries', 'simulators'],
+                        help="run only these groups (explorer and queries need a previous ingest)")
+    parser.add_argument('--no-tracemalloc', action='store_true', help="skip per-stage memory tracing")
+    parser.add_argument('--history', default=HISTORY_PATH)
+    args = parser.parse_args(argv)
+
+    rows = parse_rows(args.rows)
+    groups = set(args.only or ['ingest', 'explorer', 'queries', 'simulators'])
+    os.makedirs(BENCH_DIR, exist_ok=True)
+    bench = Bench(trace_memory=not args.no_tracemalloc)
+    root = os.path.join(BENCH_DIR, 'trade_data')
+
+    if 'ingest' in groups:
+        print(f"Preparing {rows:,} synthetic BACI rows...")
+        source, hs2_path, hs6_path = prepare_source(rows, args.pair_share, args.seed)
+        root = bench_ingest(bench, source, hs2_path, hs6_path, rows, args.workers)
+    if 'explorer' in groups:
+        bench_explorer(bench, root, args.repeat)
+    if 'queries' in groups:
+        bench_queries(bench, root, args.repeat)
+    if 'simulators' in groups:
+        bench_simulators(bench, args.sessions)
+
+    run = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'revision': git_revision(),
+        'rows': rows,
+        'pair_share': args.pair_share,
+        'workers': args.workers,
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'max_rss_mb': peak_rss_mb(),
+        'stages': bench.stages,
+    }
+    if run['max_rss_mb'] is not None:
+        print(f"\nPeak RSS {run['max_rss_mb']:,.0f} MB")
+    record_run(args.history, run)
+
+
+if __name__ == '__main__':
+    main()
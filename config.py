@@ -0,0 +1,25 @@
+import os
+
+# Source data locations (override with environment variables instead of editing paths)
+BACI_DIR = os.environ.get("BACI_DIR", ".")
+HS2_CODES_PATH = os.environ.get("HS2_CODES_PATH", "hs2_codes_corrected.csv")
+HS6_CODES_PATH = os.environ.get("HS6_CODES_PATH", "product_codes_HS17_V202501.csv")
+COUNTRY_CODES_PATH = os.environ.get("COUNTRY_CODES_PATH", "country_codes_V202501.csv")
+
+# Ingestion output: partitioned Parquet dataset read by Trade_app, or a flat CSV for MySQL loads
+DATASET_PATH = os.environ.get("TRADE_DATASET_PATH", "trade_data")
+OUTPUT_PATH = os.environ.get("TRADE_OUTPUT_PATH", "filtered_data.csv")
+CHUNK_SIZE = int(os.environ.get("BACI_CHUNK_SIZE", 1_000_000))
+INGEST_WORKERS = int(os.environ.get("INGEST_WORKERS", os.cpu_count() or 1))
+
+# Where report.py writes its JSON/HTML reports
+REPORT_DIR = os.environ.get("REPORT_DIR", "reports")
+
+# Default trade flow (BACI country codes); ingest.py --exporter/--importer also take "all"
+EXPORTER = 156  # China
+IMPORTER = 842  # USA
+
+# Allowed HS2 codes
+NEED_HS = ['04', '06', '07', '08', '09', '10', '11', '12', '13', '14', '15', '17', '18', '19', '20',
+           '21', '22', '23', '25', '26', '27', '28', '29', '30', '31', '32', '33', '34', '35', '36',
+           '37', '38', '39', '40']
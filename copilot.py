@@ -1,14 +1,33 @@
 import streamlit as st
-import pandas as pd
 import math
 
+import instrument
+import martingale
+from ledger import RoundLedger
+from session_store import BUST, TARGET
+from sim_panels import (backtest_panel, end_session, ensure_session, exact_odds_panel, get_session_store, ledger_table,
+                        monte_carlo_panel, resume_session, stored_sessions_panel, sweep_panel)
+
+APP = 'copilot'
+
+LEDGER_COLUMNS = {
+    "Round": "int32",
+    "Current Bet": "float64",
+    "Choice": ["big", "small"],
+    "Resulted Output": ["big", "small"],
+    "Result": ["Win", "Loss"],
+    "Profit/Loss": "float64",
+    "Next Bet": "float64",
+    "Total P&L": "float64",
+}
+
 # Initialize session state variables
 if 'initial_wallet' not in st.session_state:
     st.session_state.initial_wallet = 25000
 if 'wallet' not in st.session_state:
     st.session_state.wallet = 25000
-if 'bets_df' not in st.session_state:
-    st.session_state.bets_df = pd.DataFrame(columns=["Round", "Current Bet", "Choice", "Resulted Output", "Result", "Profit/Loss", "Next Bet", "Total P&L"])
+if 'ledger' not in st.session_state:
+    st.session_state.ledger = RoundLedger(LEDGER_COLUMNS)
 if 'current_bet' not in st.session_state:
     st.session_state.current_bet = 10  # Default starting bet
 if 'wins' not in st.session_state:
@@ -20,26 +39,60 @@ if 'choice' not in st.session_state:
 if 'last_win_bet' not in st.session_state:
     st.session_state.last_win_bet = 10  # Default on first win
 
+# Every round is recorded in the session store
+store = get_session_store()
+rounds = st.session_state.ledger
+
+
+def record_round(row):
+    store.append_round(st.session_state.session_id, row["Round"], row, row["Profit/Loss"], row["Result"] == "Win")
+
+
+rounds.sink = record_round
+
+# Pick up an unfinished stored session after a page reload or restart
+if 'session_id' not in st.session_state:
+    config = resume_session(store, APP, rounds)
+    if config is not None:
+        st.session_state.wallet_input = config['wallet']
+        st.session_state.starting_bet_input = config['starting_bet']
+        st.session_state.stop_wins_input = config['stop_wins']
+        st.session_state.wallet = config['wallet'] + rounds.totals["Profit/Loss"]
+        st.session_state.current_bet = rounds.value("Next Bet", -1)
+        st.session_state.wins = int((rounds.frame()["Result"] == "Win").sum())
+st.session_state.setdefault('wallet_input', 25000)
+st.session_state.setdefault('starting_bet_input', 10)
+st.session_state.setdefault('stop_wins_input', 5)
+
 # Streamlit UI
 st.title("Martingale Betting Strategy Simulator")
+instrument.streamlit_start('copilot')
 
 # User inputs
-st.session_state.initial_wallet = st.number_input("Enter your wallet balance:", min_value=1, step=1, value=25000)
-starting_bet = st.number_input("Enter your starting bet amount:", min_value=1, step=1, value=10)
-st.session_state.stop_wins = st.number_input("Stop after how many wins?", min_value=1, step=1, value=5)
+st.session_state.initial_wallet = st.number_input("Enter your wallet balance:", min_value=1, step=1, key='wallet_input')
+starting_bet = st.number_input("Enter your starting bet amount:", min_value=1, step=1, key='starting_bet_input')
+st.session_state.stop_wins = st.number_input("Stop after how many wins?", min_value=1, step=1, key='stop_wins_input')
 st.session_state.choice = st.selectbox("Choose your bet option:", ["big", "small"])
 
-# Set starting values only for empty DataFrame
-if st.session_state.bets_df.empty:
+# Set starting values only for an empty ledger
+if len(rounds) == 0:
     st.session_state.wallet = st.session_state.initial_wallet
     st.session_state.current_bet = starting_bet
     st.session_state.last_win_bet = starting_bet
 
 # Max losses before bankruptcy
 if st.session_state.wallet > 0 and st.session_state.current_bet > 0:
-    max_losses = math.floor(math.log(st.session_state.wallet / st.session_state.current_bet) / math.log(2.25))
+    max_losses = math.floor(math.log(st.session_state.wallet / st.session_state.current_bet) / math.log(martingale.MULTIPLIER))
     st.write(f"⚠️ **You can afford up to {max_losses} consecutive losses before running out of balance.**")
 
+# Clear the ledger and start a new session from the configured wallet and bet
+def start_over(starting_bet):
+    rounds.clear()
+    st.session_state.wins = 0
+    st.session_state.current_bet = starting_bet
+    st.session_state.last_win_bet = starting_bet
+    st.session_state.wallet = st.session_state.initial_wallet
+
 # Game result input
 game_result = st.selectbox("Enter the actual game result:", ["big", "small"])
 
@@ -49,23 +102,30 @@ if st.button("Update Bet Result"):
 
     # Determine profit/loss and next bet
     if result == "Win":
-        profit = round(st.session_state.current_bet * 0.98, 2)
-        next_bet = st.session_state.bets_df.iloc[0]["Current Bet"] if not st.session_state.bets_df.empty else starting_bet
+        profit = round(st.session_state.current_bet * martingale.PAYOUT, 2)
+        next_bet = rounds.value("Current Bet", 0) if len(rounds) else starting_bet
         st.session_state.last_win_bet = next_bet
         st.session_state.wins += 1
     else:
         profit = -st.session_state.current_bet
-        next_bet = round(st.session_state.current_bet * 2.25, 2)
+        next_bet = round(st.session_state.current_bet * martingale.MULTIPLIER, 2)
 
     # Update wallet
     st.session_state.wallet += profit
 
     # Calculate total P&L
-    total_pnl = st.session_state.bets_df["Profit/Loss"].sum() + profit
+    total_pnl = rounds.totals["Profit/Loss"] + profit
 
     # Append current round
+    ensure_session(store, APP, {
+        'wallet': st.session_state.initial_wallet,
+        'starting_bet': starting_bet,
+        'stop_wins': st.session_state.stop_wins,
+        'multiplier': martingale.MULTIPLIER,
+        'payout': martingale.PAYOUT,
+    })
     new_bet = {
-        "Round": len(st.session_state.bets_df) + 1,
+        "Round": len(rounds) + 1,
         "Current Bet": st.session_state.current_bet,
         "Choice": st.session_state.choice,
         "Resulted Output": game_result,
@@ -74,7 +134,8 @@ if st.button("Update Bet Result"):
         "Next Bet": next_bet,
         "Total P&L": total_pnl
     }
-    st.session_state.bets_df = pd.concat([st.session_state.bets_df, pd.DataFrame([new_bet])], ignore_index=True)
+    with instrument.stage('record_round', rows_in=len(rounds)):
+        rounds.append(new_bet)
 
     # Set the next current bet
     st.session_state.current_bet = next_bet
@@ -82,19 +143,35 @@ if st.button("Update Bet Result"):
     # Stop condition
     if st.session_state.wins >= st.session_state.stop_wins:
         st.success(f"🎉 Stopping after {st.session_state.stop_wins} wins!")
-        st.session_state.bets_df = pd.DataFrame(columns=st.session_state.bets_df.columns)
-        st.session_state.wins = 0
-        st.session_state.current_bet = starting_bet
-        st.session_state.last_win_bet = starting_bet
-        st.session_state.wallet = st.session_state.initial_wallet
+        end_session(store, TARGET)
+        start_over(starting_bet)
+    # Bust: the wallet can no longer cover the next bet
+    elif st.session_state.wallet <= 0 or st.session_state.wallet < next_bet:
+        st.error(f"💸 Bust: ₹{st.session_state.wallet:.2f} left, next bet would be ₹{next_bet:.2f}.")
+        end_session(store, BUST)
+        start_over(starting_bet)
 
 # Display bets table
-if not st.session_state.bets_df.empty:
-    st.dataframe(st.session_state.bets_df)
+if len(rounds):
+    ledger_table(rounds)
 
 # Show remaining balance and total P&L
-final_pnl = st.session_state.bets_df["Profit/Loss"].sum()
+final_pnl = rounds.totals["Profit/Loss"]
 calculated_wallet = st.session_state.initial_wallet + final_pnl
 
 st.write(f"💰 **Remaining Wallet Balance:** ₹{calculated_wallet:.2f}")
 st.write(f"📊 **Total P&L:** ₹{final_pnl:.2f}")
+
+# Exact odds from here until the win target or bust
+exact_odds_panel(st.session_state.wallet, starting_bet, st.session_state.stop_wins,
+                 st.session_state.current_bet, st.session_state.wins, reset_on_win=True)
+
+# Simulate many sessions with the same settings
+monte_carlo_panel(st.session_state.initial_wallet, starting_bet, st.session_state.stop_wins,
+                  st.session_state.choice, reset_on_win=True)
+sweep_panel(st.session_state.initial_wallet, starting_bet, st.session_state.stop_wins, reset_on_win=True)
+backtest_panel(st.session_state.initial_wallet, starting_bet, st.session_state.stop_wins, ["big", "small"],
+               reset_on_win=True)
+stored_sessions_panel(store, APP)
+
+instrument.streamlit_panel()
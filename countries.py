@@ -0,0 +1,47 @@
+import os
+
+import pandas as pd
+
+import config
+
+# Selector entry meaning "every country"
+ALL = 'All'
+
+
+# A country selection as a list of BACI codes, or None for every country.
+# Accepts None, a code, a list of codes, or text such as "all", "156" or "156,392".
+def as_list(value):
+    if value is None:
+        return None
+    if isinstance(value, str):
+        if value.strip().lower() in ('all', ''):
+            return None
+        return [int(code) for code in value.split(',')]
+    if isinstance(value, (list, tuple, set)):
+        return sorted(int(code) for code in value)
+    return [int(value)]
+
+
+# BACI country names keyed by code, from the release's country_codes_V*.csv
+# (empty when the file is not available, in which case codes are shown as they are)
+def load_names(path=config.COUNTRY_CODES_PATH):
+    if not path or not os.path.exists(path):
+        return {}
+    codes = pd.read_csv(path)
+    return dict(zip(codes['country_code'].astype(int), codes['country_name'].astype(str)))
+
+
+def label(code, names):
+    if code == ALL or code is None:
+        return ALL
+    name = names.get(int(code))
+    return f"{name} ({code})" if name else str(code)
+
+
+# "China to USA", "China to all", "all to USA"
+def describe(exporter, importer, names):
+    def name(code):
+        if code == ALL or code is None:
+            return "all"
+        return names.get(int(code), str(code))
+    return f"{name(exporter)} to {name(importer)}"
@@ -0,0 +1,303 @@
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import pandas as pd
+
+import instrument
+import trade_export
+
+TABLE = 'filtered_export_data'
+NUMBER_COLUMNS = ['quantity(in metric tons)', 'value(thousands USD)']
+
+# MySQL connection settings (override with environment variables)
+POOL_SIZE = int(os.environ.get('MYSQL_POOL_SIZE', 8))
+
+# Point at a SQLite file holding the same table to run the explorer without MySQL
+SQLITE_PATH = os.environ.get('EXPORT_DB_SQLITE')
+MYSQL_CONFIG = {
+    'host': os.environ.get('MYSQL_HOST', '127.0.0.1'),
+    'user': os.environ.get('MYSQL_USER', 'root'),
+    'password': os.environ.get('MYSQL_PASSWORD', '1234'),
+    'database': os.environ.get('MYSQL_DATABASE', 'export_data'),
+    'charset': 'utf8mb4',
+}
+
+
+def mysql_connect():
+    import pymysql
+    return pymysql.connect(**MYSQL_CONFIG)
+
+
+def sqlite_connect(path):
+    return sqlite3.connect(path, check_same_thread=False)
+
+
+# Small thread-safe connection pool.
+# At most `max_size` connections are open at once; further callers wait for one to be
+# returned. `connect` opens a new DB-API connection and `placeholder` is the driver's
+# parameter marker ('%s' for pymysql, '?' for sqlite3) so the same queries run on a
+# local stand-in.
+class ConnectionPool:
+    def __init__(self, connect, max_size=8, placeholder='%s', timeout=30):
+        self.connect = connect
+        self.placeholder = placeholder
+        self.timeout = timeout
+        self.slots = threading.BoundedSemaphore(max_size)
+        self.idle = queue.LifoQueue()
+
+    @contextmanager
+    def connection(self):
+        if not self.slots.acquire(timeout=self.timeout):
+            raise TimeoutError("Timed out waiting for a database connection")
+        try:
+            try:
+                conn = self.idle.get_nowait()
+                if hasattr(conn, 'ping'):
+                    conn.ping(reconnect=True)
+            except queue.Empty:
+                conn = self.connect()
+            try:
+                yield conn
+            except Exception:
+                conn.close()
+                raise
+            self.idle.put(conn)
+        finally:
+            self.slots.release()
+
+    def close(self):
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+# LRU cache of query results with a time-to-live, shared across sessions.
+# Concurrent misses on the same key wait for a single load instead of all querying.
+class QueryCache:
+    def __init__(self, max_entries=128, ttl=600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.loading = {}
+        self.generation = 0
+        self.lock = threading.Lock()
+
+    def _lookup(self, key):
+        entry = self.entries.get(key)
+        if entry is None or time.monotonic() - entry[0] >= self.ttl:
+            return None
+        self.entries.move_to_end(key)
+        return entry
+
+    def get_or_load(self, key, load):
+        with self.lock:
+            entry = self._lookup(key)
+            if entry is not None:
+                return entry[1]
+            key_lock = self.loading.setdefault(key, threading.Lock())
+
+        with key_lock:
+            with self.lock:
+                entry = self._lookup(key)
+                if entry is not None:
+                    return entry[1]
+                generation = self.generation
+            value = load()
+            with self.lock:
+                # A result loaded across an invalidate() may be stale, so it is not kept
+                if generation == self.generation:
+                    self.entries[key] = (time.monotonic(), value)
+                    self.entries.move_to_end(key)
+                    while len(self.entries) > self.max_entries:
+                        self.entries.popitem(last=False)
+                self.loading.pop(key, None)
+        return value
+
+    # Drop every cached result, e.g. after the table has been reloaded
+    def invalidate(self):
+        with self.lock:
+            self.entries.clear()
+            self.generation += 1
+
+
+# Pool for the configured database: MySQL, or the SQLite stand-in when EXPORT_DB_SQLITE is set
+def create_pool(max_size=POOL_SIZE):
+    if SQLITE_PATH:
+        return ConnectionPool(lambda: sqlite_connect(SQLITE_PATH), max_size=max_size, placeholder='?')
+    return ConnectionPool(mysql_connect, max_size=max_size)
+
+
+# Sorted, de-duplicated filter values so equivalent selections share a cache entry.
+# An empty exporter/importer selection means every country.
+def normalize_filters(years, hs2, exporters=(), importers=()):
+    return (
+        tuple(sorted({int(year) for year in years})),
+        tuple(sorted({str(code) for code in hs2})),
+        tuple(sorted({int(code) for code in exporters or ()})),
+        tuple(sorted({int(code) for code in importers or ()})),
+    )
+
+
+# Build the WHERE clause for a year/HS2/exporter/importer selection
+def where_clause(years, hs2, placeholder='%s', exporters=(), importers=()):
+    where_clauses = []
+    values = []
+
+    for column, selected in [('year', years), ('HS2', hs2), ('exporter', exporters), ('importer', importers)]:
+        if selected:
+            placeholders = ','.join([placeholder] * len(selected))
+            where_clauses.append(f"{column} IN ({placeholders})")
+            values.extend(selected)
+
+    where_sql = " AND ".join(where_clauses)
+    return (" WHERE " + where_sql if where_sql else ""), values
+
+
+@instrument.timed('sql', rows_out=len)
+def read_sql(pool, query, params=None):
+    with pool.connection() as conn:
+        return pd.read_sql(query, conn, params=params)
+
+
+# Keyset pagination order; (year, HS2, HS6, exporter, importer) identifies a row
+KEY_COLUMNS = ['year', 'HS2', 'HS6', 'exporter', 'importer']
+PAGE_SIZE = 100
+
+
+# "Row key > after" spelled out column by column, which MySQL can turn into an index range
+def after_clause(after, placeholder='%s'):
+    clause, values = None, []
+    for column, value in reversed(list(zip(KEY_COLUMNS, after))):
+        if clause is None:
+            clause = f"{column} > {placeholder}"
+            values = [value]
+        else:
+            clause = f"({column} > {placeholder} OR ({column} = {placeholder} AND {clause}))"
+            values = [value, value] + values
+    return clause, values
+
+
+# Years and HS2 codes for the filter widgets, read from the small dimension tables
+def fetch_filter_options(pool):
+    years = read_sql(pool, "SELECT year FROM dim_year ORDER BY year")
+    hs2 = read_sql(pool, "SELECT HS2, HS2_desc FROM dim_hs2 ORDER BY HS2")
+    return years, hs2
+
+
+# Exporter/importer pairs in the table, for the country selectors
+def fetch_country_pairs(pool):
+    return read_sql(pool, "SELECT exporter, importer FROM dim_pair ORDER BY exporter, importer")
+
+
+# Row count and value/quantity sums for a selection, computed by the database
+def fetch_totals(pool, cache, years, hs2, exporters=(), importers=()):
+    years, hs2, exporters, importers = normalize_filters(years, hs2, exporters, importers)
+
+    def load():
+        where_sql, values = where_clause(years, hs2, pool.placeholder, exporters, importers)
+        query = (
+            "SELECT COUNT(*) AS row_count, "
+            "SUM(`quantity(in metric tons)`) AS total_quantity, "
+            f"SUM(`value(thousands USD)`) AS total_value FROM {TABLE}" + where_sql
+        )
+        totals = read_sql(pool, query, values).iloc[0]
+        return {
+            'rows': int(totals['row_count']),
+            'quantity': float(totals['total_quantity'] or 0),
+            'value': float(totals['total_value'] or 0),
+        }
+
+    return cache.get_or_load(('totals', years, hs2, exporters, importers), load)
+
+
+# One page of rows in key order, starting after the key tuple `after` (None for the first page)
+def load_page(pool, years, hs2, after=None, page_size=PAGE_SIZE, exporters=(), importers=()):
+    where_sql, values = where_clause(years, hs2, pool.placeholder, exporters, importers)
+    if after is not None:
+        clause, after_values = after_clause(after, pool.placeholder)
+        where_sql += (" AND " if where_sql else " WHERE ") + clause
+        values = values + after_values
+    order_sql = ", ".join(KEY_COLUMNS)
+    query = f"SELECT * FROM {TABLE}{where_sql} ORDER BY {order_sql} LIMIT {int(page_size)}"
+    df = read_sql(pool, query, values)
+    for column in NUMBER_COLUMNS:
+        df[column] = pd.to_numeric(df[column], errors='coerce')
+    return df
+
+
+# Cached version of load_page for the page the user is looking at
+def fetch_page(pool, cache, years, hs2, after=None, page_size=PAGE_SIZE, exporters=(), importers=()):
+    years, hs2, exporters, importers = normalize_filters(years, hs2, exporters, importers)
+    after = tuple(after) if after is not None else None
+    return cache.get_or_load(
+        ('page', years, hs2, exporters, importers, after, page_size),
+        lambda: load_page(pool, years, hs2, after, page_size, exporters, importers),
+    )
+
+
+# Key of the last row on a page, used as `after` for the next page
+def page_key(page):
+    return tuple(value.item() if hasattr(value, 'item') else value for value in page.iloc[-1][KEY_COLUMNS])
+
+
+# Walk every page of a selection without caching them, e.g. for exports
+def iter_pages(pool, years, hs2, page_size=50_000, exporters=(), importers=()):
+    years, hs2, exporters, importers = normalize_filters(years, hs2, exporters, importers)
+    after = None
+    while True:
+        page = load_page(pool, years, hs2, after, page_size, exporters, importers)
+        if page.empty:
+            return
+        yield page
+        if len(page) < page_size:
+            return
+        after = page_key(page)
+
+
+# Download file for a selection, written page by page. Used as the st.download_button
+# callback, which Streamlit keeps and calls again for every download, so the pages are
+# walked afresh on each call.
+def export_pages(pool, years, hs2, export_format, exporters=(), importers=()):
+    return trade_export.export_file(iter_pages(pool, years, hs2, exporters=exporters, importers=importers),
+                                    export_format)
+
+
+# Apply a schema/migration script. Statements marked with a "-- mysql only" comment
+# are skipped on the SQLite stand-in, and indexes that already exist are left alone,
+# so the script can be re-run to refresh the dimension tables after a reload.
+def apply_schema(pool, path):
+    with open(path, encoding='utf-8') as handle:
+        script = handle.read()
+    with pool.connection() as conn:
+        cursor = conn.cursor()
+        for statement in script.split(';'):
+            lines = statement.strip().splitlines()
+            if pool.placeholder == '?' and any(line.strip().lower() == '-- mysql only' for line in lines):
+                continue
+            sql = "\n".join(line for line in lines if not line.strip().startswith('--')).strip()
+            if not sql:
+                continue
+            try:
+                cursor.execute(sql)
+            except Exception as error:
+                message = str(error).lower()
+                if not (sql.upper().startswith('CREATE INDEX') and ('duplicate key name' in message or 'already exists' in message)):
+                    raise
+        conn.commit()
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Apply the explorer schema (indexes and dimension tables).")
+    parser.add_argument('script', nargs='?', default=os.path.join(os.path.dirname(__file__), 'schema.sql'))
+    args = parser.parse_args()
+    apply_schema(create_pool(max_size=1), args.script)
+    print(f"Applied {args.script}")
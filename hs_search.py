@@ -0,0 +1,133 @@
+import json
+import os
+import re
+from bisect import bisect_left
+
+import numpy as np
+
+# Stored next to the partitioned dataset; the underscore keeps pyarrow from reading it
+INDEX_NAME = '_search.json'
+# Bump when the stored layout changes
+INDEX_VERSION = 1
+
+TOKEN = re.compile(r"[a-z0-9]+")
+STOPWORDS = {'a', 'an', 'and', 'by', 'for', 'in', 'its', 'of', 'or', 'the', 'their', 'to', 'whether', 'with'}
+# Score of a whole-word match relative to a prefix match, of a code-prefix match, and of a
+# match found only in the product's chapter (HS2) description
+PREFIX_WEIGHT = 0.6
+CODE_WEIGHT = 3.0
+CHAPTER_WEIGHT = 0.5
+LIMIT = 50
+
+
+def tokenize(text):
+    return TOKEN.findall(str(text).lower())
+
+
+def index_path(root):
+    return os.path.join(root, INDEX_NAME)
+
+
+# Inverted index over HS2 and HS6 descriptions for typeahead search.
+# Terms are kept in a sorted list, so every term starting with a typed prefix is one
+# contiguous slice found by bisection; each term maps to the sorted ids of the codes whose
+# description contains it. A query is a set of prefixes that must all match, through the
+# code itself, its own description, or (for HS6 codes) its chapter's description.
+class HSSearchIndex:
+    def __init__(self, levels, codes, descriptions, chapters, terms, postings):
+        self.levels = np.asarray(levels)
+        self.codes = np.asarray(codes)
+        self.descriptions = list(descriptions)
+        # Id of each code's HS2 chapter (an HS2 code is its own chapter)
+        self.chapters = np.asarray(chapters, dtype=np.int32)
+        self.terms = list(terms)
+        self.postings = [np.asarray(ids, dtype=np.int32) for ids in postings]
+        self.idf = np.log(len(self.codes) / np.array([len(ids) for ids in self.postings] or [1])) + 1
+        self.lengths = np.array([len(tokenize(text)) for text in self.descriptions])
+        # Codes in sorted order, so a typed code prefix is also a bisection
+        self.code_order = np.argsort(self.codes, kind='stable')
+        self.sorted_codes = self.codes[self.code_order]
+
+    # Build from code -> description mappings (e.g. the explorer lookups or HS code tables)
+    @classmethod
+    def build(cls, hs2, hs6):
+        hs2, hs6 = dict(sorted(hs2.items())), dict(sorted(hs6.items()))
+        levels = ['HS2'] * len(hs2) + ['HS6'] * len(hs6)
+        codes = list(hs2) + list(hs6)
+        descriptions = list(hs2.values()) + list(hs6.values())
+        chapter_ids = {code: i for i, code in enumerate(hs2)}
+        chapters = list(range(len(hs2))) + [chapter_ids.get(code[:2], -1) for code in hs6]
+
+        inverted = {}
+        for i, text in enumerate(descriptions):
+            for token in set(tokenize(text)) - STOPWORDS:
+                inverted.setdefault(token, []).append(i)
+        terms = sorted(inverted)
+        return cls(levels, codes, descriptions, chapters, terms, [inverted[term] for term in terms])
+
+    # Per-code score for one typed term: the best match among the terms it is a prefix of
+    def term_scores(self, term):
+        scores = np.zeros(len(self.codes))
+        start = bisect_left(self.terms, term)
+        end = bisect_left(self.terms, term + '\uffff', lo=start)
+        for position in range(start, end):
+            weight = self.idf[position] * (1.0 if self.terms[position] == term else PREFIX_WEIGHT)
+            ids = self.postings[position]
+            scores[ids] = np.maximum(scores[ids], weight)
+        if term.isdigit():
+            start, end = np.searchsorted(self.sorted_codes, [term, term + '\uffff'])
+            scores[self.code_order[start:end]] = CODE_WEIGHT * (1 + len(term))
+        # HS6 codes also match through their chapter's description, at a lower weight
+        has_chapter = self.chapters >= 0
+        chapter_scores = np.zeros(len(self.codes))
+        chapter_scores[has_chapter] = scores[self.chapters[has_chapter]] * CHAPTER_WEIGHT
+        return np.maximum(scores, chapter_scores)
+
+    # Ranked (code, description) matches for a typed query at one level ('HS2' or 'HS6').
+    # Every term must match; whole words beat prefixes, rarer words beat common ones, and
+    # shorter descriptions win ties. `codes` restricts results, e.g. to codes in the data.
+    def search(self, query, level='HS6', codes=None, limit=LIMIT):
+        terms = tokenize(query)
+        # Complete words that carry no meaning are dropped; the last one may still be typed
+        terms = [term for i, term in enumerate(terms) if term not in STOPWORDS or i == len(terms) - 1]
+        if not terms:
+            return []
+        mask = self.levels == level
+        if codes is not None:
+            mask &= np.isin(self.codes, list(codes))
+        total = np.zeros(len(self.codes))
+        for term in terms:
+            scores = self.term_scores(term)
+            mask &= scores > 0
+            total += scores
+        ids = np.flatnonzero(mask)
+        order = np.lexsort((self.codes[ids], self.lengths[ids], -total[ids]))[:limit]
+        return [(str(self.codes[i]), self.descriptions[i]) for i in ids[order]]
+
+    def write(self, root):
+        data = {
+            'version': INDEX_VERSION,
+            'levels': self.levels.tolist(),
+            'codes': self.codes.tolist(),
+            'descriptions': self.descriptions,
+            'chapters': self.chapters.tolist(),
+            'terms': self.terms,
+            'postings': [ids.tolist() for ids in self.postings],
+        }
+        path = index_path(root)
+        with open(path + '.tmp', 'w', encoding='utf-8') as handle:
+            json.dump(data, handle, separators=(',', ':'))
+        os.replace(path + '.tmp', path)
+
+    # The index stored with a dataset, or None when it has none (a dataset built before the
+    # index was added) or one in an older layout
+    @classmethod
+    def load(cls, root):
+        try:
+            with open(index_path(root), encoding='utf-8') as handle:
+                data = json.load(handle)
+        except (OSError, ValueError):
+            return None
+        if data.get('version') != INDEX_VERSION:
+            return None
+        return cls(data['levels'], data['codes'], data['descriptions'], data['chapters'], data['terms'], data['postings'])
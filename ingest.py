@@ -0,0 +1,442 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import partial
+
+import pandas as pd
+
+import config
+import countries
+import hs_search
+import trade_data
+
+# BACI column names -> report column names
+RENAME = {
+    't': 'year',
+    'i': 'exporter',
+    'j': 'importer',
+    'k': 'HS6',
+    'v': 'value(thousands USD)',
+    'q': 'quantity(in metric tons)',
+}
+
+OUTPUT_COLUMNS = [
+    'year',
+    'exporter',
+    'importer',
+    'HS2',
+    'HS4',
+    'HS6',
+    'value(thousands USD)',
+    'quantity(in metric tons)',
+    'HS2_desc',
+    'HS6_desc',
+]
+
+YEAR_PATTERN = re.compile(r"_Y(\d{4})_")
+
+
+# Load HS2/HS6 description tables with zero-padded codes
+def load_hs_codes(hs2_path, hs6_path):
+    hs2_codes = pd.read_csv(hs2_path, dtype={'HS2': str})
+    hs2_codes['HS2'] = hs2_codes['HS2'].str.strip().str.zfill(2)
+    hs2_codes = hs2_codes.rename(columns={'Description': 'HS2_desc'})[['HS2', 'HS2_desc']]
+
+    hs6_codes = pd.read_csv(hs6_path, dtype={'code': str})
+    hs6_codes = hs6_codes.rename(columns={'code': 'HS6', 'description': 'HS6_desc'})
+    hs6_codes['HS6'] = hs6_codes['HS6'].str.strip().str.zfill(6)
+    hs6_codes = hs6_codes[['HS6', 'HS6_desc']]
+
+    return hs2_codes.drop_duplicates('HS2'), hs6_codes.drop_duplicates('HS6')
+
+
+# List BACI yearly files in a directory as (year, path), oldest first
+def find_baci_files(source_dir):
+    files = []
+    for name in os.listdir(source_dir):
+        match = YEAR_PATTERN.search(name)
+        if name.startswith('BACI') and name.endswith('.csv') and match:
+            files.append((int(match.group(1)), os.path.join(source_dir, name)))
+    return sorted(files)
+
+
+# Stream one BACI file and yield only the rows we report on.
+# The exporter/importer and HS2 filters run on the raw chunk, so padding and
+# description merges only ever touch the rows that survive them.
+# `exporter`/`importer` are lists of BACI codes, or None to keep every country.
+def iter_filtered_chunks(path, hs2_codes, hs6_codes, exporter=config.EXPORTER, importer=config.IMPORTER,
+                         hs2_filter=config.NEED_HS, chunksize=config.CHUNK_SIZE, stats=None):
+    reader = pd.read_csv(
+        path,
+        usecols=list(RENAME),
+        dtype={'t': 'int16', 'i': 'int32', 'j': 'int32', 'k': str},
+        chunksize=chunksize,
+    )
+    for chunk in reader:
+        if stats is not None:
+            stats['rows_read'] = stats.get('rows_read', 0) + len(chunk)
+        mask = pd.Series(True, index=chunk.index)
+        if exporter is not None:
+            mask &= chunk['i'].isin(exporter)
+        if importer is not None:
+            mask &= chunk['j'].isin(importer)
+        chunk = chunk[mask]
+        if chunk.empty:
+            continue
+
+        hs6 = chunk['k'].str.strip().str.zfill(6)
+        if hs2_filter is not None:
+            keep = hs6.str[:2].isin(hs2_filter)
+            chunk, hs6 = chunk[keep], hs6[keep]
+            if chunk.empty:
+                continue
+
+        df = chunk.rename(columns=RENAME)
+        df['HS6'] = hs6
+        df['HS2'] = hs6.str[:2]
+        df['HS4'] = hs6.str[:4]
+        df['value(thousands USD)'] = pd.to_numeric(df['value(thousands USD)'], errors='coerce')
+        df['quantity(in metric tons)'] = pd.to_numeric(df['quantity(in metric tons)'], errors='coerce')
+
+        # Merge with HS2 and HS6 description data
+        df = df.merge(hs2_codes, on='HS2', how='left')
+        df = df.merge(hs6_codes, on='HS6', how='left')
+
+        yield df[OUTPUT_COLUMNS]
+
+
+# Stream one year file into its output; runs inside a worker process.
+# CSV output goes to a per-year part file, Parquet output to the year's partitions under `target`.
+def ingest_year(year, path, target, fmt, hs2_codes, hs6_codes, exporter, importer, hs2_filter, chunksize):
+    start = time.perf_counter()
+    stats = {}
+    rows = 0
+    chunks = iter_filtered_chunks(path, hs2_codes, hs6_codes, exporter, importer, hs2_filter, chunksize, stats)
+    if fmt == 'parquet':
+        # Each partition's rollup is written next to its data when the writer closes, so only
+        # the stats travel back to the parent
+        writer = trade_data.YearPartitionWriter(target, year)
+        try:
+            for df in chunks:
+                writer.write(df)
+                rows += len(df)
+        finally:
+            writer.close()
+    else:
+        with open(target, 'w', newline='', encoding='utf-8') as handle:
+            for df in chunks:
+                df.to_csv(handle, header=False, index=False)
+                rows += len(df)
+    return {
+        'year': year,
+        'rows_read': stats.get('rows_read', 0),
+        'rows_kept': rows,
+        'seconds': time.perf_counter() - start,
+    }
+
+
+# Print per-file throughput for a finished year
+def report_year(result):
+    seconds = max(result['seconds'], 1e-9)
+    print(f"Y{result['year']}: {result['rows_read']:,} rows read, {result['rows_kept']:,} kept "
+          f"in {seconds:.1f}s ({result['rows_read'] / seconds:,.0f} rows/sec)")
+
+
+# Run ingestion jobs across a process pool (or inline for a single worker)
+def run_jobs(jobs, workers):
+    results = []
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(ingest_year, *job) for job in jobs]
+            for future in as_completed(futures):
+                results.append(future.result())
+                report_year(results[-1])
+    else:
+        for job in jobs:
+            results.append(ingest_year(*job))
+            report_year(results[-1])
+    return results
+
+
+# Typeahead search index over the HS2/HS6 descriptions (see hs_search.py), stored with the dataset
+def write_search_index(root, hs2_codes, hs6_codes):
+    index = hs_search.HSSearchIndex.build(
+        dict(zip(hs2_codes['HS2'], hs2_codes['HS2_desc'].fillna('').astype(str))),
+        dict(zip(hs6_codes['HS6'], hs6_codes['HS6_desc'].fillna('').astype(str))),
+    )
+    index.write(root)
+
+
+# Record of what a dataset was built from, kept next to it so rebuilds can skip unchanged years
+MANIFEST_NAME = '_manifest.json'
+# Bump when the output layout changes so existing datasets are rebuilt from scratch
+MANIFEST_VERSION = 3
+
+
+# Size, mtime and SHA-256 of a file. When size and mtime match `previous`, its hash is
+# reused instead of reading the file again.
+def file_fingerprint(path, previous=None):
+    stat = os.stat(path)
+    if previous and previous.get('size') == stat.st_size and previous.get('mtime_ns') == stat.st_mtime_ns:
+        return previous
+    digest = hashlib.sha256()
+    with open(path, 'rb') as handle:
+        for block in iter(partial(handle.read, 1 << 20), b''):
+            digest.update(block)
+    return {'name': os.path.basename(path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+            'sha256': digest.hexdigest()}
+
+
+# Where a dataset's manifest lives: inside the Parquet dataset, or beside the CSV's year parts
+def manifest_path(output, fmt):
+    if fmt == 'parquet':
+        return os.path.join(output, MANIFEST_NAME)
+    return os.path.join(csv_parts_dir(output), MANIFEST_NAME)
+
+
+def csv_parts_dir(output):
+    return output + '.parts'
+
+
+def read_manifest(path):
+    try:
+        with open(path, encoding='utf-8') as handle:
+            return json.load(handle)
+    except (OSError, ValueError):
+        return None
+
+
+def write_manifest(path, manifest):
+    with open(path + '.tmp', 'w', encoding='utf-8') as handle:
+        json.dump(manifest, handle, indent=1, sort_keys=True)
+    os.replace(path + '.tmp', path)
+
+
+# Settings that apply to every year; if any of them change, every year is rebuilt.
+# The HS code tables are compared by content, so their descriptions stay in step with the data.
+def build_settings(fmt, hs2_path, hs6_path, exporter, importer, hs2_filter, previous):
+    previous = previous or {}
+    return {
+        'version': MANIFEST_VERSION,
+        'format': fmt,
+        'exporter': countries.as_list(exporter),
+        'importer': countries.as_list(importer),
+        'hs2_filter': sorted(hs2_filter) if hs2_filter else None,
+        'hs2_codes': file_fingerprint(hs2_path, previous.get('hs2_codes')),
+        'hs6_codes': file_fingerprint(hs6_path, previous.get('hs6_codes')),
+    }
+
+
+def same_settings(old, new):
+    def comparable(settings):
+        return {key: value['sha256'] if isinstance(value, dict) else value for key, value in settings.items()}
+    return comparable(old) == comparable(new)
+
+
+# Ingest BACI year files into the output dataset, reprocessing only what changed.
+# A manifest records each year file's size/mtime/hash and the HS code tables and filters the
+# dataset was built with. When those settings still match, only years whose source file
+# changed (or appeared) are ingested, and years whose file disappeared are dropped; anything
+# else (no manifest, changed settings, or `full=True`) rebuilds every year.
+# Years are fanned out to a process pool and written to a staging area first:
+#  - Parquet: each exporter's updated year=Y directory, with the partition's own rollup, is
+#    swapped in with a rename and only those years' HS2 rollup files are rebuilt; a full
+#    build swaps the whole directory.
+#  - CSV: per-year parts are kept in <output>.parts and the CSV is re-concatenated from them
+#    oldest year first, then moved over `output` in one rename.
+# The manifest is written last, so an interrupted run just redoes the same years next time.
+def build_dataset(source_dir, hs2_path, hs6_path, output, exporter=config.EXPORTER, importer=config.IMPORTER,
+                  hs2_filter=config.NEED_HS, chunksize=config.CHUNK_SIZE, workers=1, fmt='parquet', full=False):
+    hs2_codes, hs6_codes = load_hs_codes(hs2_path, hs6_path)
+    exporter, importer = countries.as_list(exporter), countries.as_list(importer)
+    files = find_baci_files(source_dir)
+    if not files:
+        raise FileNotFoundError(f"No BACI_* yearly files found in {source_dir}")
+
+    start = time.perf_counter()
+    previous = read_manifest(manifest_path(output, fmt))
+    settings = build_settings(fmt, hs2_path, hs6_path, exporter, importer, hs2_filter,
+                              previous and previous['settings'])
+    full = full or previous is None or not same_settings(previous['settings'], settings)
+    old_years = {} if full else previous['years']
+
+    sources = {str(year): file_fingerprint(path, old_years.get(str(year), {}).get('source')) for year, path in files}
+    changed = [
+        (year, path) for year, path in files
+        if str(year) not in old_years or old_years[str(year)]['source']['sha256'] != sources[str(year)]['sha256']
+    ]
+    removed = [int(year) for year in old_years if year not in sources]
+    years = {year: entry for year, entry in old_years.items() if year in sources}
+    for year, entry in years.items():
+        entry['source'] = sources[year]
+
+    if full:
+        print(f"Building all {len(files)} years")
+    elif changed or removed:
+        print(f"Updating {len(changed)} of {len(files)} years"
+              + (f" ({', '.join(str(year) for year, _ in changed)})" if changed else "")
+              + (f", dropping {', '.join(map(str, removed))}" if removed else ""))
+    else:
+        print(f"{output} is up to date")
+
+    results = []
+    if fmt == 'parquet':
+        staging = output.rstrip('/\\') + '.tmp'
+        shutil.rmtree(staging, ignore_errors=True)
+        try:
+            jobs = [
+                (year, path, staging, fmt, hs2_codes, hs6_codes, exporter, importer, hs2_filter, chunksize)
+                for year, path in changed
+            ]
+            results = run_jobs(jobs, workers)
+            if full:
+                os.makedirs(staging, exist_ok=True)
+                trade_data.refresh_rollup(staging, [year for year, _ in changed])
+                write_search_index(staging, hs2_codes, hs6_codes)
+                trade_data.swap_directory(staging, output)
+            elif changed or removed:
+                updated = [year for year, _ in changed] + removed
+                trade_data.swap_partitions(staging, output, updated)
+                trade_data.refresh_rollup(output, updated)
+            # The code tables are part of the settings, so an unchanged build only lacks the
+            # index when it was written before the index existed
+            if not full and not os.path.exists(hs_search.index_path(output)):
+                write_search_index(output, hs2_codes, hs6_codes)
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+    else:
+        part_dir = csv_parts_dir(output)
+        if full:
+            shutil.rmtree(part_dir, ignore_errors=True)
+        os.makedirs(part_dir, exist_ok=True)
+        jobs = [
+            (year, path, os.path.join(part_dir, f'{year}.csv.tmp'), fmt, hs2_codes, hs6_codes,
+             exporter, importer, hs2_filter, chunksize)
+            for year, path in changed
+        ]
+        try:
+            results = run_jobs(jobs, workers)
+            for job in jobs:
+                os.replace(job[2], job[2][:-len('.tmp')])
+        finally:
+            for job in jobs:
+                if os.path.exists(job[2]):
+                    os.remove(job[2])
+        for year in removed:
+            os.remove(os.path.join(part_dir, f'{year}.csv'))
+
+        if full or changed or removed or not os.path.exists(output):
+            tmp_output = output + '.tmp'
+            with open(tmp_output, 'w', newline='', encoding='utf-8') as handle:
+                pd.DataFrame(columns=OUTPUT_COLUMNS).to_csv(handle, index=False)
+                for year, _ in files:
+                    with open(os.path.join(part_dir, f'{year}.csv'), encoding='utf-8') as part:
+                        shutil.copyfileobj(part, handle)
+            os.replace(tmp_output, output)
+
+    for result in results:
+        years[str(result['year'])] = {
+            'source': sources[str(result['year'])],
+            'rows_read': result['rows_read'],
+            'rows_kept': result['rows_kept'],
+        }
+    write_manifest(manifest_path(output, fmt), {'settings': settings, 'years': years})
+
+    total_read = sum(result['rows_read'] for result in results)
+    total_rows = sum(entry['rows_kept'] for entry in years.values())
+    elapsed = time.perf_counter() - start
+    print(f"{output} holds {total_rows:,} rows ({total_read:,} rows read in {elapsed:.1f}s "
+          f"with {workers} worker{'s' if workers != 1 else ''})")
+    return total_rows
+
+
+# Convert an existing filtered_data.csv into the partitioned Parquet dataset
+def convert_csv(csv_path, output, chunksize=config.CHUNK_SIZE):
+    staging = output.rstrip('/\\') + '.tmp'
+    shutil.rmtree(staging, ignore_errors=True)
+    writers = {}
+    codes = []
+    rows = 0
+    try:
+        reader = pd.read_csv(csv_path, dtype={'HS2': str, 'HS4': str, 'HS6': str}, chunksize=chunksize)
+        for chunk in reader:
+            chunk.columns = chunk.columns.str.strip()
+            chunk['HS6'] = chunk['HS6'].str.zfill(6)
+            chunk['HS2'] = chunk['HS6'].str[:2]
+            chunk['HS4'] = chunk['HS6'].str[:4]
+            for column in ['exporter', 'importer']:
+                if column not in chunk.columns:
+                    chunk[column] = getattr(config, column.upper())
+            for column in ['value(thousands USD)', 'quantity(in metric tons)']:
+                chunk[column] = pd.to_numeric(chunk[column], errors='coerce')
+            for year, part in chunk.groupby('year', sort=True):
+                writer = writers.get(year)
+                if writer is None:
+                    writer = writers[year] = trade_data.YearPartitionWriter(staging, year)
+                writer.write(part)
+            codes.append(chunk[['HS2', 'HS2_desc', 'HS6', 'HS6_desc']].drop_duplicates('HS6'))
+            rows += len(chunk)
+        for writer in writers.values():
+            writer.close()
+        if writers:
+            trade_data.refresh_rollup(staging, writers)
+            # Without the code tables, the index covers the codes and descriptions in the CSV
+            codes = pd.concat(codes, ignore_index=True)
+            write_search_index(staging, codes.drop_duplicates('HS2'), codes.drop_duplicates('HS6'))
+        trade_data.swap_directory(staging, output)
+    finally:
+        for writer in writers.values():
+            writer.close()
+        shutil.rmtree(staging, ignore_errors=True)
+    print(f"Converted {rows:,} rows from {csv_path} to {output}")
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the filtered trade dataset from BACI yearly files.")
+    parser.add_argument('--source-dir', default=config.BACI_DIR, help="directory containing BACI_* yearly CSVs")
+    parser.add_argument('--hs2-codes', default=config.HS2_CODES_PATH, help="HS2 code/description CSV")
+    parser.add_argument('--hs6-codes', default=config.HS6_CODES_PATH, help="HS6 product code CSV")
+    parser.add_argument('--format', choices=['parquet', 'csv'], default='parquet',
+                        help="partitioned Parquet dataset (default) or a single CSV")
+    parser.add_argument('--output', help="output path (default: config.DATASET_PATH or config.OUTPUT_PATH)")
+    parser.add_argument('--from-csv', metavar='CSV',
+                        help="convert an existing filtered_data.csv to the Parquet dataset instead of reading BACI files")
+    parser.add_argument('--exporter', default=str(config.EXPORTER),
+                        help="BACI exporter country code(s), comma-separated, or 'all'")
+    parser.add_argument('--importer', default=str(config.IMPORTER),
+                        help="BACI importer country code(s), comma-separated, or 'all'")
+    parser.add_argument('--all-hs2', action='store_true', help="keep every HS2 chapter, not just NEED_HS")
+    parser.add_argument('--chunksize', type=int, default=config.CHUNK_SIZE, help="rows read per chunk")
+    parser.add_argument('--workers', type=int, default=config.INGEST_WORKERS,
+                        help="number of year files processed in parallel")
+    parser.add_argument('--full', action='store_true',
+                        help="rebuild every year instead of only those whose source files changed")
+    args = parser.parse_args(argv)
+
+    if args.from_csv:
+        convert_csv(args.from_csv, args.output or config.DATASET_PATH, chunksize=args.chunksize)
+        return
+
+    build_dataset(
+        args.source_dir,
+        args.hs2_codes,
+        args.hs6_codes,
+        args.output or (config.DATASET_PATH if args.format == 'parquet' else config.OUTPUT_PATH),
+        exporter=args.exporter,
+        importer=args.importer,
+        hs2_filter=None if args.all_hs2 else config.NEED_HS,
+        chunksize=args.chunksize,
+        workers=args.workers,
+        fmt=args.format,
+        full=args.full,
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,189 @@
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+import uuid
+
+# Append one JSON line per stage to this file (always on when set)
+LOG_PATH = os.environ.get('TRADE_METRICS_LOG')
+# Also measure allocations with tracemalloc (slows down whatever is being measured)
+TRACE_ALLOCATIONS = os.environ.get('TRADE_METRICS_TRACE') == '1'
+
+_local = threading.local()
+_log_lock = threading.Lock()
+
+
+# Stages recorded during one script run (or one standalone call when only logging)
+class Run:
+    def __init__(self, app, trace_allocations=False):
+        self.app = app
+        self.id = uuid.uuid4().hex[:12]
+        self.started = time.time()
+        self.trace_allocations = trace_allocations
+        self.records = []
+        self.depth = 0
+        # Peak allocation seen by each open stage, innermost last
+        self.peaks = []
+        # Tracing started for this run is stopped again when it finishes
+        self.owns_tracing = trace_allocations and not tracemalloc.is_tracing()
+        if self.owns_tracing:
+            tracemalloc.start()
+
+
+class Stage:
+    def __init__(self, run, name, rows_in=None, standalone=False):
+        self.run = run
+        self.name = name
+        self.rows_in = rows_in
+        self.rows_out = None
+        self.standalone = standalone
+
+    def __enter__(self):
+        run = self.run
+        # Added on entry so stages are listed in the order they started
+        self.record = {'stage': self.name, 'depth': run.depth}
+        run.records.append(self.record)
+        run.depth += 1
+        if run.trace_allocations:
+            current, peak = tracemalloc.get_traced_memory()
+            if run.peaks:
+                run.peaks[-1] = max(run.peaks[-1], peak)
+            run.peaks.append(current)
+            tracemalloc.reset_peak()
+            self.allocated = current
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self.start
+        run = self.run
+        run.depth -= 1
+        record = self.record
+        record['seconds'] = round(seconds, 6)
+        if self.rows_in is not None:
+            record['rows_in'] = int(self.rows_in)
+        if self.rows_out is not None:
+            record['rows_out'] = int(self.rows_out)
+        if run.trace_allocations:
+            current, peak = tracemalloc.get_traced_memory()
+            peak = max(run.peaks.pop(), peak)
+            if run.peaks:
+                run.peaks[-1] = max(run.peaks[-1], peak)
+            record['alloc_mb'] = round((current - self.allocated) / 2 ** 20, 3)
+            record['peak_mb'] = round((peak - self.allocated) / 2 ** 20, 3)
+        if exc[0] is not None:
+            record['error'] = exc[0].__name__
+        if self.standalone:
+            if run.owns_tracing:
+                tracemalloc.stop()
+            write_log(run)
+        return False
+
+
+# Stand-in used while nothing is being recorded
+class _NullStage:
+    rows_in = rows_out = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __setattr__(self, name, value):
+        pass
+
+
+NULL_STAGE = _NullStage()
+
+
+# Start recording stages for the current thread's run, e.g. one Streamlit rerun.
+# Nothing is recorded unless `enabled` is set or TRADE_METRICS_LOG is configured.
+# A run the previous script run left open (it ended in st.rerun(), st.stop() or an
+# exception before reaching finish_run) is closed first, so its records are still logged
+# and the tracing it started is stopped.
+def start_run(app, enabled=False, trace_allocations=TRACE_ALLOCATIONS):
+    finish_run()
+    _local.run = Run(app, trace_allocations) if enabled or LOG_PATH else None
+    return _local.run
+
+
+# Stop recording; writes the run to the metrics log and returns its records
+def finish_run():
+    run = getattr(_local, 'run', None)
+    _local.run = None
+    if run is None:
+        return []
+    if run.owns_tracing:
+        tracemalloc.stop()
+    write_log(run)
+    return run.records
+
+
+# Time a block:
+#     with instrument.stage('filter', rows_in=len(df)) as s:
+#         ...
+#         s.rows_out = len(result)
+# Calls outside a run (e.g. a download callback on another thread) are logged on their own
+# when TRADE_METRICS_LOG is set, and are free otherwise.
+def stage(name, rows_in=None):
+    run = getattr(_local, 'run', None)
+    if run is not None:
+        return Stage(run, name, rows_in)
+    if LOG_PATH:
+        return Stage(Run('standalone', TRACE_ALLOCATIONS), name, rows_in, standalone=True)
+    return NULL_STAGE
+
+
+# Decorator form of stage(). `rows_in` is called with the function's arguments and
+# `rows_out` with its result to fill in the row counts.
+def timed(name=None, rows_in=None, rows_out=None):
+    def decorate(fn):
+        label = name or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if getattr(_local, 'run', None) is None and not LOG_PATH:
+                return fn(*args, **kwargs)
+            with stage(label, rows_in(*args, **kwargs) if rows_in else None) as current:
+                result = fn(*args, **kwargs)
+                if rows_out is not None:
+                    current.rows_out = rows_out(result)
+                return result
+
+        return wrapper
+
+    return decorate
+
+
+def write_log(run):
+    if not LOG_PATH or not run.records:
+        return
+    lines = [json.dumps({'time': run.started, 'app': run.app, 'run': run.id, **record}) for record in run.records]
+    with _log_lock, open(LOG_PATH, 'a', encoding='utf-8') as handle:
+        handle.write("\n".join(lines) + "\n")
+
+
+# Streamlit hooks: a sidebar toggle at the top of the script, the timings panel at the end
+def streamlit_start(app):
+    import streamlit as st
+    enabled = st.sidebar.toggle("🐞 Debug timings", key='debug_timings')
+    trace = enabled and st.sidebar.checkbox("Trace allocations", key='debug_trace', value=TRACE_ALLOCATIONS)
+    start_run(app, enabled=enabled, trace_allocations=trace or TRACE_ALLOCATIONS)
+
+
+def streamlit_panel():
+    import streamlit as st
+    records = finish_run()
+    if not st.session_state.get('debug_timings'):
+        return
+    with st.sidebar.expander("Stage timings", expanded=True):
+        if not records:
+            st.write("No stages recorded.")
+            return
+        rows = [{**record, 'stage': "· " * record['depth'] + record['stage']} for record in records]
+        st.dataframe(rows, hide_index=True)
+        total = sum(record['seconds'] for record in records if record['depth'] == 0)
+        st.caption(f"{total * 1000:,.1f} ms in top-level stages")
@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+
+# Most recent rounds shown in the apps' history tables
+DISPLAY_ROWS = 1000
+
+
+# Round-by-round record of a betting session, shared by copilot.py and simulator.py.
+# Each column is a typed numpy array that doubles in capacity when full, so appending a
+# round is amortized O(1) however long the session runs. Label columns (choices, results)
+# are stored as small integer codes and shown as categoricals. Sums of the numeric columns
+# are kept as rounds are appended instead of being recomputed from the whole history.
+#
+# `columns` maps each column name to a numpy dtype, or to the list of labels it may hold.
+# `sink`, if set, is called with every appended row, e.g. to record it in a SessionStore.
+class RoundLedger:
+    def __init__(self, columns, capacity=256, sink=None):
+        self.columns = dict(columns)
+        self.labels = {name: list(spec) for name, spec in self.columns.items() if isinstance(spec, (list, tuple))}
+        self.codes = {name: {label: code for code, label in enumerate(labels)} for name, labels in self.labels.items()}
+        self.capacity = capacity
+        self.data = {name: np.empty(capacity, dtype=self._dtype(name)) for name in self.columns}
+        self.size = 0
+        self.totals = {name: 0 for name in self.columns if name not in self.labels}
+        self._frame = None
+        self.sink = sink
+
+    def _dtype(self, name):
+        return np.int8 if name in self.labels else np.dtype(self.columns[name])
+
+    def __len__(self):
+        return self.size
+
+    def _grow(self):
+        self.capacity *= 2
+        for name, values in self.data.items():
+            grown = np.empty(self.capacity, dtype=values.dtype)
+            grown[:self.size] = values[:self.size]
+            self.data[name] = grown
+
+    # Add one round; record=False skips the sink, e.g. when replaying stored rounds
+    def append(self, row, record=True):
+        if self.size == self.capacity:
+            self._grow()
+        for name, value in row.items():
+            if name in self.labels:
+                self.data[name][self.size] = self.codes[name][value]
+            else:
+                self.data[name][self.size] = value
+                self.totals[name] += value
+        self.size += 1
+        self._frame = None
+        if record and self.sink is not None:
+            self.sink(row)
+
+    # Read-only view of a numeric column's filled rows
+    def column(self, name):
+        values = self.data[name][:self.size].view()
+        values.flags.writeable = False
+        return values
+
+    def value(self, name, row):
+        value = self.data[name][row if row >= 0 else self.size + row]
+        return self.labels[name][value] if name in self.labels else value.item()
+
+    def clear(self):
+        self.size = 0
+        self.totals = dict.fromkeys(self.totals, 0)
+        self._frame = None
+
+    # DataFrame over the last `tail` rounds (all of them by default). Numeric columns are
+    # views of the ledger's arrays rather than copies, and the frame is cached until the
+    # next append, so reruns without a new round do not rebuild it.
+    def frame(self, tail=None):
+        start = 0 if tail is None else max(self.size - tail, 0)
+        if self._frame is not None and self._frame[0] == start:
+            return self._frame[1]
+
+        columns = {}
+        for name in self.columns:
+            values = self.data[name][start:self.size].view()
+            values.flags.writeable = False
+            if name in self.labels:
+                values = pd.Categorical.from_codes(values, categories=self.labels[name])
+            columns[name] = values
+        frame = pd.DataFrame(columns, index=pd.RangeIndex(start, self.size), copy=False)
+        self._frame = (start, frame)
+        return frame
@@ -0,0 +1,105 @@
+from dataclasses import dataclass
+
+import numpy as np
+
+import instrument
+
+# Strategy defaults used by copilot.py and simulator.py
+MULTIPLIER = 2.25  # next bet after a loss
+PAYOUT = 0.98  # net profit per unit staked on a win (a 1.98x return)
+
+# Session outcomes
+ACTIVE, TARGET, BUST, MAX_ROUNDS = 0, 1, 2, 3
+
+
+@dataclass
+class SimulationResult:
+    final_pnl: np.ndarray
+    rounds: np.ndarray
+    status: np.ndarray
+
+    @property
+    def bust_rate(self):
+        return float(np.mean(self.status == BUST))
+
+    @property
+    def target_rate(self):
+        return float(np.mean(self.status == TARGET))
+
+    def summary(self):
+        pnl = self.final_pnl
+        return {
+            'sessions': int(pnl.size),
+            'bust_rate': self.bust_rate,
+            'target_rate': self.target_rate,
+            'unfinished_rate': float(np.mean(self.status == MAX_ROUNDS)),
+            'mean_pnl': float(pnl.mean()),
+            'median_pnl': float(np.median(pnl)),
+            'p05_pnl': float(np.percentile(pnl, 5)),
+            'p95_pnl': float(np.percentile(pnl, 95)),
+            'mean_rounds': float(self.rounds.mean()),
+            'max_rounds': int(self.rounds.max()),
+        }
+
+
+# Probability that a single bet wins.
+# `bias` is the chance of the first outcome (Red / big); "Both" picks a side at random each round.
+def choice_win_prob(choice, bias=0.5, first=('Red', 'big')):
+    if choice == 'Both':
+        return 0.5
+    return bias if choice in first else 1 - bias
+
+
+# Run one batch of sessions as arrays, advancing every still-active session one round per step
+def _simulate_batch(n, rng, wallet, starting_bet, multiplier, payout, stop_wins, win_prob, reset_on_win,
+                    max_rounds):
+    cash = np.full(n, float(wallet))
+    bet = np.full(n, float(starting_bet))
+    wins = np.zeros(n, dtype=np.int32)
+    rounds = np.zeros(n, dtype=np.int32)
+    status = np.full(n, ACTIVE, dtype=np.int8)
+    active = np.arange(n)
+
+    for _ in range(max_rounds):
+        # Wallet floor: a session that cannot cover its next bet is bust
+        broke = bet[active] > cash[active]
+        status[active[broke]] = BUST
+        active = active[~broke]
+        if active.size == 0:
+            break
+
+        stake = bet[active]
+        won = rng.random(active.size) < win_prob
+        cash[active] += np.where(won, np.round(stake * payout, 2), -stake)
+        rounds[active] += 1
+        wins[active] += won
+        bet[active] = np.where(won, starting_bet if reset_on_win else stake, np.round(stake * multiplier, 2))
+
+        done = wins[active] >= stop_wins
+        status[active[done]] = TARGET
+        active = active[~done]
+        if active.size == 0:
+            break
+
+    status[active] = MAX_ROUNDS
+    return np.round(cash - wallet, 2), rounds, status
+
+
+# Monte Carlo run of the martingale strategy over many independent sessions.
+# reset_on_win=True follows copilot.py (back to the starting bet after a win);
+# False follows simulator.py (keep the winning bet).
+@instrument.timed(rows_out=lambda result: result.rounds.sum())
+def simulate(wallet, starting_bet, stop_wins, sessions=100_000, multiplier=MULTIPLIER, payout=PAYOUT,
+             win_prob=0.5, reset_on_win=True, max_rounds=10_000, seed=None, batch_size=1_000_000):
+    if starting_bet <= 0 or wallet <= 0:
+        raise ValueError("wallet and starting_bet must be positive")
+
+    # One child generator per batch keeps results reproducible for a given seed and batch size
+    batches = [min(batch_size, sessions - start) for start in range(0, sessions, batch_size)]
+    generators = [np.random.default_rng(child) for child in np.random.SeedSequence(seed).spawn(len(batches))]
+    parts = [
+        _simulate_batch(n, rng, wallet, starting_bet, multiplier, payout, stop_wins, win_prob, reset_on_win,
+                        max_rounds)
+        for n, rng in zip(batches, generators)
+    ]
+    return SimulationResult(*(np.concatenate(arrays) for arrays in zip(*parts)))
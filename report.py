@@ -0,0 +1,266 @@
+import argparse
+import html
+import json
+import math
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+import config
+import countries
+import rollup
+import trade_data
+
+VALUE, QUANTITY = rollup.VALUE_COLUMNS
+# Ranked views: each one orders codes by its own column
+VIEWS = {'value': VALUE, 'quantity': QUANTITY}
+TOP_HS2 = 10
+TOP_HS4 = 5
+# Report levels: the rollup's levels without the country pair
+LEVELS = {'hs2': ['year', 'HS2'], 'hs4': ['year', 'HS2', 'HS4']}
+# Partial sums kept before they are folded into one
+FOLD_EVERY = 64
+
+
+# HS2 descriptions keyed by zero-padded code (empty when the code table is not available)
+def hs2_descriptions(path=config.HS2_CODES_PATH):
+    if not path or not os.path.exists(path):
+        return {}
+    codes = pd.read_csv(path, dtype={'HS2': str})
+    codes['HS2'] = codes['HS2'].str.strip().str.zfill(2)
+    return dict(zip(codes['HS2'], codes['Description'].astype(str)))
+
+
+# The year x HS2 and year x HS2 x HS4 totals for the selected exporters/importers (lists of
+# codes, None for all), from the partition rollups stored with the Parquet dataset or, for a
+# flat CSV, summed up chunk by chunk. Partial sums are folded together as they pile up, so
+# memory is bounded by the year x HS4 result rather than the input.
+def load_cubes(dataset=None, csv_path=None, need_hs=config.NEED_HS, chunksize=config.CHUNK_SIZE,
+               exporters=None, importers=None):
+    exporters, importers = countries.as_list(exporters), countries.as_list(importers)
+    if csv_path:
+        frames = iter_csv(csv_path, chunksize, exporters, importers)
+    else:
+        frames = trade_data.iter_hs4_rollup(dataset or config.DATASET_PATH, exporters, importers)
+    partials = []
+    for frame in frames:
+        frame = frame.astype({'HS2': str, 'HS4': str})
+        if need_hs is not None:
+            frame = frame[frame['HS2'].isin(need_hs)]
+        partials.append(aggregate(frame, 'hs4'))
+        if len(partials) >= FOLD_EVERY:
+            partials = [aggregate(pd.concat(partials, ignore_index=True), 'hs4')]
+    columns = LEVELS['hs4'] + rollup.VALUE_COLUMNS
+    hs4 = aggregate(pd.concat(partials, ignore_index=True), 'hs4') if partials else pd.DataFrame(columns=columns)
+    return {'hs2': aggregate(hs4, 'hs2'), 'hs4': hs4}
+
+
+# Rows of a flat CSV for the selected exporters/importers, with HS2/HS4 derived from HS6
+def iter_csv(csv_path, chunksize, exporters, importers):
+    reader = pd.read_csv(csv_path, usecols=['year', 'exporter', 'importer', 'HS6'] + rollup.VALUE_COLUMNS,
+                         dtype={'HS6': str}, chunksize=chunksize)
+    for chunk in reader:
+        if exporters is not None:
+            chunk = chunk[chunk['exporter'].isin(exporters)]
+        if importers is not None:
+            chunk = chunk[chunk['importer'].isin(importers)]
+        chunk = chunk.assign(HS6=chunk['HS6'].str.zfill(6))
+        yield chunk.assign(HS2=chunk['HS6'].str[:2], HS4=chunk['HS6'].str[:4])
+
+
+# Totals summed over every country pair
+def aggregate(df, level):
+    keys = LEVELS[level]
+    return df.groupby(keys, sort=True)[rollup.VALUE_COLUMNS].sum().reset_index()
+
+
+# Add share of the year's total and growth over the previous year for both metrics.
+# Growth compares with the same code one calendar year earlier; it is NaN when that year has
+# no trade in the code.
+def add_measures(cube, keys):
+    totals = cube.groupby('year')[rollup.VALUE_COLUMNS].transform('sum')
+    previous = cube[keys + rollup.VALUE_COLUMNS].copy()
+    previous['year'] += 1
+    cube = cube.merge(previous, on=keys, how='left', suffixes=('', ' previous'))
+    for name, column in VIEWS.items():
+        cube[f'{name}_share'] = cube[column] / totals[column].to_numpy()
+        before = cube[column + ' previous']
+        cube[f'{name}_yoy'] = (cube[column] / before.where(before != 0)) - 1
+    return cube.drop(columns=[column + ' previous' for column in rollup.VALUE_COLUMNS])
+
+
+# The largest `k` rows of each group by `column`, all groups at once
+def top_k(cube, groups, column, k):
+    ranked = cube.sort_values(groups + [column], ascending=[True] * len(groups) + [False], kind='stable')
+    ranked = ranked[ranked.groupby(groups, sort=False).cumcount() < k]
+    return ranked.assign(rank=ranked.groupby(groups, sort=False).cumcount() + 1)
+
+
+# Top HS2 chapters per year and top HS4 headings under each of them, for one ranked view.
+# Returns two flat tables (hs2, hs4); hs4 only holds headings of the selected chapters.
+def rank_view(hs2, hs4, column, top_hs2=TOP_HS2, top_hs4=TOP_HS4):
+    best_hs2 = top_k(hs2, ['year'], column, top_hs2)
+    best_hs4 = top_k(hs4.merge(best_hs2[['year', 'HS2']], on=['year', 'HS2']), ['year', 'HS2'], column, top_hs4)
+    return best_hs2, best_hs4
+
+
+def clean(value):
+    if isinstance(value, (float, np.floating)):
+        return None if math.isnan(value) else float(value)
+    if isinstance(value, np.integer):
+        return int(value)
+    return value
+
+
+def entry(row, code_column):
+    item = {'rank': int(row['rank']), 'code': row[code_column]}
+    for name, column in VIEWS.items():
+        item[name] = clean(row[column])
+        item[f'{name}_share'] = clean(row[f'{name}_share'])
+        item[f'{name}_yoy'] = clean(row[f'{name}_yoy'])
+    return item
+
+
+# Build the full report: for every ranked view and year, the year's totals and the top HS2
+# chapters, each with its top HS4 headings
+def build_report(cubes, descriptions=None, top_hs2=TOP_HS2, top_hs4=TOP_HS4):
+    descriptions = descriptions or {}
+    hs2 = add_measures(cubes['hs2'], ['year', 'HS2'])
+    hs4 = add_measures(cubes['hs4'], ['year', 'HS2', 'HS4'])
+    year_totals = hs2.groupby('year')[rollup.VALUE_COLUMNS].sum()
+
+    report = {'top_hs2': top_hs2, 'top_hs4': top_hs4, 'views': {}}
+    for name, column in VIEWS.items():
+        best_hs2, best_hs4 = rank_view(hs2, hs4, column, top_hs2, top_hs4)
+        headings = {}
+        for key, group in best_hs4.groupby(['year', 'HS2'], sort=False):
+            headings[key] = [entry(row, 'HS4') for row in group.to_dict('records')]
+
+        years = {}
+        for row in best_hs2.to_dict('records'):
+            year = int(row['year'])
+            if year not in years:
+                totals = year_totals.loc[row['year']]
+                years[year] = {'value': clean(totals[VALUE]), 'quantity': clean(totals[QUANTITY]), 'HS2': []}
+            item = entry(row, 'HS2')
+            item['description'] = descriptions.get(row['HS2'], '')
+            item['HS4'] = headings.get((row['year'], row['HS2']), [])
+            years[year]['HS2'].append(item)
+        report['views'][name] = {str(year): years[year] for year in sorted(years)}
+    return report
+
+
+# The notebook's final_dict layout for one view:
+# {year: {"HS2": {code: {total_value, total_quantity}}, "HS4": {code: [{HS4_code, ...}]}}}
+def final_dict(report, view='value'):
+    result = {}
+    for year, data in report['views'][view].items():
+        result[int(year)] = {
+            'HS2': {item['code']: {'total_value': item['value'], 'total_quantity': item['quantity']}
+                    for item in data['HS2']},
+            'HS4': {item['code']: [{'HS4_code': sub['code'], 'total_value': sub['value'],
+                                    'total_quantity': sub['quantity']} for sub in item['HS4']]
+                    for item in data['HS2']},
+        }
+    return result
+
+
+def format_number(value):
+    return '' if value is None else f"{value:,.0f}"
+
+
+def format_percent(value):
+    return '' if value is None else f"{value:+.1%}"
+
+
+def format_share(value):
+    return '' if value is None else f"{value:.1%}"
+
+
+def html_rows(item, level):
+    cells = [f'<td class="{level}">{html.escape(item["code"])}</td>',
+             f'<td>{html.escape(item.get("description", ""))}</td>']
+    for name in VIEWS:
+        cells += [f'<td class="num">{format_number(item[name])}</td>',
+                  f'<td class="num">{format_share(item[f"{name}_share"])}</td>',
+                  f'<td class="num">{format_percent(item[f"{name}_yoy"])}</td>']
+    rows = [f'<tr class="{level}">{"".join(cells)}</tr>']
+    for sub in item.get('HS4', []):
+        rows += html_rows(sub, 'hs4')
+    return rows
+
+
+# A standalone HTML page: one table per view and year, HS4 rows indented under their chapter
+def render_html(report, title):
+    header = ('<tr><th>Code</th><th>Description</th>'
+              '<th>Value (thousands USD)</th><th>Share</th><th>YoY</th>'
+              '<th>Quantity (metric tons)</th><th>Share</th><th>YoY</th></tr>')
+    parts = [
+        '<!DOCTYPE html>', '<html><head><meta charset="utf-8">', f'<title>{html.escape(title)}</title>',
+        '<style>body{font-family:sans-serif}table{border-collapse:collapse;margin-bottom:1.5em}'
+        'td,th{padding:2px 8px;border-bottom:1px solid #ddd}.num{text-align:right}'
+        'tr.hs2{font-weight:bold;background:#f4f4f4}td.hs4{padding-left:24px}</style>',
+        '</head><body>', f'<h1>{html.escape(title)}</h1>',
+    ]
+    for name, years in report['views'].items():
+        parts.append(f'<h2>Top {report["top_hs2"]} HS2 / top {report["top_hs4"]} HS4 by {name}</h2>')
+        for year, data in years.items():
+            parts.append(f'<h3>{year}: {format_number(data["value"])} thousand USD, '
+                         f'{format_number(data["quantity"])} metric tons</h3>')
+            parts.append(f'<table>{header}')
+            for item in data['HS2']:
+                parts += html_rows(item, 'hs2')
+            parts.append('</table>')
+    parts.append('</body></html>')
+    return '\n'.join(parts)
+
+
+def write_file(path, text):
+    with open(path + '.tmp', 'w', encoding='utf-8') as handle:
+        handle.write(text)
+    os.replace(path + '.tmp', path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Top HS2 chapters per year and top HS4 headings per chapter, ranked by value and by quantity, "
+                    "with share of the year's total and year-over-year growth.")
+    parser.add_argument('--dataset', default=config.DATASET_PATH, help="Parquet dataset written by ingest.py")
+    parser.add_argument('--csv', help="read a flat filtered_data.csv instead of the dataset's rollup")
+    parser.add_argument('--hs2-codes', default=config.HS2_CODES_PATH, help="HS2 code/description CSV")
+    parser.add_argument('--exporter', default=str(config.EXPORTER),
+                        help="BACI exporter country code(s), comma-separated, or 'all'")
+    parser.add_argument('--importer', default=str(config.IMPORTER),
+                        help="BACI importer country code(s), comma-separated, or 'all'")
+    parser.add_argument('--all-hs2', action='store_true', help="rank every HS2 chapter, not just NEED_HS")
+    parser.add_argument('--top-hs2', type=int, default=TOP_HS2)
+    parser.add_argument('--top-hs4', type=int, default=TOP_HS4)
+    parser.add_argument('--output-dir', default=config.REPORT_DIR)
+    parser.add_argument('--name', default='trade_report', help="output file name without extension")
+    parser.add_argument('--format', nargs='+', choices=['json', 'html'], default=['json', 'html'])
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    exporters, importers = countries.as_list(args.exporter), countries.as_list(args.importer)
+    cubes = load_cubes(args.dataset, args.csv, None if args.all_hs2 else config.NEED_HS,
+                       exporters=exporters, importers=importers)
+    report = build_report(cubes, hs2_descriptions(args.hs2_codes), args.top_hs2, args.top_hs4)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    paths = []
+    if 'json' in args.format:
+        paths.append(os.path.join(args.output_dir, args.name + '.json'))
+        write_file(paths[-1], json.dumps(report, indent=1))
+    if 'html' in args.format:
+        paths.append(os.path.join(args.output_dir, args.name + '.html'))
+        names = countries.load_names()
+        flow = countries.describe(*[codes[0] if codes and len(codes) == 1 else countries.ALL
+                                    for codes in (exporters, importers)], names)
+        write_file(paths[-1], render_html(report, f"Exports from {flow}"))
+    print(f"Wrote {', '.join(paths)} ({len(report['views']['value'])} years) in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
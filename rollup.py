@@ -0,0 +1,133 @@
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+VALUE_COLUMNS = ['value(thousands USD)', 'quantity(in metric tons)']
+
+# Rollup levels and the keys each one is grouped by. Both keep the country pair, so any
+# exporter/importer selection can be answered from them. There is no HS6 level: keyed by
+# pair it would hold about one row per trade row (BACI is unique on year, pair and HS6).
+LEVELS = {
+    'hs2': ['year', 'exporter', 'importer', 'HS2'],
+    'hs4': ['year', 'exporter', 'importer', 'HS2', 'HS4'],
+}
+CODE_COLUMNS = ['HS2', 'HS4']
+PAIR = ['exporter', 'importer']
+
+# The HS4 rollup is stored per partition, next to its data file (the exporter and year come
+# from the directory), so it is written by the worker that wrote the data and is swapped in
+# and out with it. The leading underscore keeps pyarrow from reading it as data.
+PARTITION_ROLLUP = '_rollup.parquet'
+PARTITION_KEYS = ['importer', 'HS2', 'HS4']
+
+# The HS2 rollup has one file per year under _rollup/hs2/, built from that year's partition
+# rollups, so refreshing some years only rewrites their files. Files are sorted by exporter
+# and importer with small row groups, so a country filter only decodes the row groups that
+# can hold it.
+ROLLUP_DIR = '_rollup'
+ROW_GROUP_SIZE = 65_536
+
+
+# Sum trade rows up to one rollup level
+def aggregate(df, level):
+    keys = LEVELS[level]
+    return df.groupby(keys, observed=True, sort=True)[VALUE_COLUMNS].sum().reset_index()
+
+
+# Sum an Arrow table of trade rows (or of a finer rollup) by `keys`, sorted by them.
+# min_count=0 makes an all-missing group sum to 0, as pandas does.
+def sum_table(table, keys):
+    options = pc.ScalarAggregateOptions(min_count=0)
+    summed = table.group_by(keys).aggregate([(column, 'sum', options) for column in VALUE_COLUMNS])
+    summed = summed.rename_columns([name[:-len('_sum')] if name.endswith('_sum') else name for name in summed.column_names])
+    summed = summed.select(keys + VALUE_COLUMNS)
+    return summed.sort_by([(key, 'ascending') for key in keys])
+
+
+# Write the HS4 rollup of one partition's rows into its directory
+def write_partition_rollup(directory, table):
+    path = os.path.join(directory, PARTITION_ROLLUP)
+    pq.write_table(sum_table(table.select(PARTITION_KEYS + VALUE_COLUMNS), PARTITION_KEYS), path + '.tmp')
+    os.replace(path + '.tmp', path)
+
+
+def rollup_dir(root):
+    return os.path.join(root, ROLLUP_DIR)
+
+
+def hs2_dir(root):
+    return os.path.join(rollup_dir(root), 'hs2')
+
+
+def hs2_path(root, year):
+    return os.path.join(hs2_dir(root), f'{int(year)}.parquet')
+
+
+# Rebuild the HS2 rollup file of one year from its partition rollups, given as
+# (exporter, path) pairs in exporter order. Partitions are read and summed one at a time, so
+# memory is bounded by one partition's rollup. A year with no partitions loses its file.
+def write_year(root, year, partitions):
+    path = hs2_path(root, year)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # The leading dot keeps readers of the directory from seeing a half-written file
+    scratch = os.path.join(os.path.dirname(path), f'.{int(year)}.parquet.tmp')
+    schema = pa.schema([('year', pa.int16()), ('exporter', pa.int32()), ('importer', pa.int32()), ('HS2', pa.string())]
+                       + [(column, pa.float64()) for column in VALUE_COLUMNS])
+    written = 0
+    with pq.ParquetWriter(scratch, schema) as writer:
+        for exporter, partition_path in partitions:
+            table = sum_table(pq.read_table(partition_path), ['importer', 'HS2'])
+            table = table.add_column(0, 'exporter', pa.array([int(exporter)] * len(table), pa.int32()))
+            table = table.add_column(0, 'year', pa.array([int(year)] * len(table), pa.int16()))
+            writer.write_table(table.cast(schema), row_group_size=ROW_GROUP_SIZE)
+            written += len(table)
+    if written:
+        os.replace(scratch, path)
+    else:
+        os.remove(scratch)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+# Read the HS2 rollup, optionally only the rows for some exporters/importers (lists of
+# codes, or None for all) and years, and only some columns; the filters are pushed down into
+# the Parquet reader
+def read_rollup(root, exporters=None, importers=None, years=None, columns=None):
+    directory = hs2_dir(root)
+    files = sorted(name for name in os.listdir(directory) if name.endswith('.parquet')) if os.path.isdir(directory) else []
+    if years is not None:
+        files = [name for name in files if int(name.split('.')[0]) in {int(year) for year in years}]
+    if not files:
+        empty = pd.DataFrame({column: pd.Series(dtype=dtype) for column, dtype in
+                              [('year', 'int16'), ('exporter', 'int32'), ('importer', 'int32'), ('HS2', 'category')]
+                              + [(column, 'float64') for column in VALUE_COLUMNS]})
+        return empty if columns is None else empty[columns]
+    expression = None
+    for column, codes in zip(PAIR, [exporters, importers]):
+        if codes is not None:
+            condition = pc.field(column).isin([int(code) for code in codes])
+            expression = condition if expression is None else expression & condition
+    tables = [pq.read_table(os.path.join(directory, name), columns=columns, filters=expression) for name in files]
+    cube = pa.concat_tables(tables).to_pandas()
+    if 'HS2' in cube.columns:
+        cube['HS2'] = cube['HS2'].astype('category')
+    return cube
+
+
+# Country pairs present in the dataset
+def pairs(root):
+    cube = read_rollup(root, columns=PAIR)
+    return cube.drop_duplicates().sort_values(PAIR, ignore_index=True)
+
+
+# HS2 totals for a year/HS2 selection from the HS2 rollup
+def hs2_totals(cube, years=None, hs2=None):
+    mask = pd.Series(True, index=cube.index)
+    if years:
+        mask &= cube['year'].isin(years)
+    if hs2:
+        mask &= cube['HS2'].isin(hs2)
+    return cube[mask].groupby('HS2', observed=True)[VALUE_COLUMNS].sum()
@@ -0,0 +1,37 @@
+-- Indexes and dimension tables for the MySQL explorer (app.py).
+-- Apply with `python db.py` (or `mysql export_data < schema.sql` the first time).
+-- Re-run after every reload of filtered_export_data to refresh the dimension tables.
+
+-- pandas.to_sql creates TEXT columns, which MySQL cannot use in a composite index
+-- mysql only
+ALTER TABLE filtered_export_data
+    MODIFY year SMALLINT NOT NULL,
+    MODIFY exporter INT NOT NULL,
+    MODIFY importer INT NOT NULL,
+    MODIFY HS2 CHAR(2) NOT NULL,
+    MODIFY HS4 CHAR(4) NOT NULL,
+    MODIFY HS6 CHAR(6) NOT NULL;
+
+-- Year/HS2 filters, SUM() totals and keyset pages ordered by (year, HS2, HS6, exporter, importer)
+CREATE INDEX idx_year_hs2_hs6 ON filtered_export_data (year, HS2, HS6, exporter, importer);
+
+-- HS2-only selections
+CREATE INDEX idx_hs2_year ON filtered_export_data (HS2, year);
+
+-- One exporter (e.g. China to all, or a single pair) and one importer (e.g. all to USA):
+-- the country prefix narrows the scan to that country's rows, still in keyset page order
+CREATE INDEX idx_exporter_year ON filtered_export_data (exporter, year, HS2, HS6, importer);
+CREATE INDEX idx_importer_year ON filtered_export_data (importer, year, HS2, HS6, exporter);
+
+-- Filter options come from these instead of a DISTINCT scan of the fact table
+DROP TABLE IF EXISTS dim_year;
+CREATE TABLE dim_year AS
+    SELECT DISTINCT year FROM filtered_export_data;
+
+DROP TABLE IF EXISTS dim_hs2;
+CREATE TABLE dim_hs2 AS
+    SELECT DISTINCT HS2, HS2_desc FROM filtered_export_data WHERE HS2_desc IS NOT NULL;
+
+DROP TABLE IF EXISTS dim_pair;
+CREATE TABLE dim_pair AS
+    SELECT DISTINCT exporter, importer FROM filtered_export_data;
@@ -0,0 +1,194 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import closing
+
+import pandas as pd
+
+# SQLite file holding every recorded betting session (override with SESSION_STORE_PATH)
+STORE_PATH = os.environ.get('SESSION_STORE_PATH', 'sessions.db')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id TEXT PRIMARY KEY,
+    app TEXT NOT NULL,
+    config TEXT NOT NULL,
+    started_at REAL NOT NULL,
+    ended_at REAL,
+    status TEXT,
+    rounds INTEGER,
+    pnl REAL
+);
+CREATE INDEX IF NOT EXISTS idx_sessions_config ON sessions (config);
+
+-- Append-only round log; `row` is the ledger row as JSON
+CREATE TABLE IF NOT EXISTS rounds (
+    session_id TEXT NOT NULL,
+    round INTEGER NOT NULL,
+    profit REAL NOT NULL,
+    won INTEGER NOT NULL,
+    row TEXT NOT NULL,
+    recorded_at REAL NOT NULL,
+    PRIMARY KEY (session_id, round)
+);
+
+-- Running totals per strategy configuration, updated as rounds and sessions are written
+CREATE TABLE IF NOT EXISTS strategy_stats (
+    config TEXT PRIMARY KEY,
+    app TEXT NOT NULL,
+    sessions INTEGER NOT NULL DEFAULT 0,
+    finished INTEGER NOT NULL DEFAULT 0,
+    targets INTEGER NOT NULL DEFAULT 0,
+    busts INTEGER NOT NULL DEFAULT 0,
+    rounds INTEGER NOT NULL DEFAULT 0,
+    wins INTEGER NOT NULL DEFAULT 0,
+    total_profit REAL NOT NULL DEFAULT 0,
+    finished_pnl REAL NOT NULL DEFAULT 0
+);
+"""
+
+logger = logging.getLogger(__name__)
+
+# Session end states
+TARGET, BUST, RESET = 'target', 'bust', 'reset'
+
+
+# Canonical text for a strategy configuration, used as its stats key
+def config_key(app, config):
+    return json.dumps({'app': app, **config}, sort_keys=True)
+
+
+# Local store of betting sessions.
+# Writes are queued and applied by a background thread that commits in batches of up to
+# `batch_size` operations or every `flush_interval` seconds, so recording a round never
+# waits on the disk. Reads call flush() first, so they see everything queued before them.
+class SessionStore:
+    def __init__(self, path=STORE_PATH, batch_size=100, flush_interval=0.5):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.pending = queue.Queue()
+        # Writes lost to failed batches since the store was opened
+        self.dropped_writes = 0
+        with closing(self._connect()) as conn:
+            conn.executescript(SCHEMA)
+        self.writer = threading.Thread(target=self._run, name='session-store-writer', daemon=True)
+        self.writer.start()
+        atexit.register(self.flush)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _run(self):
+        conn = self._connect()
+        while True:
+            batch = [self.pending.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.pending.get(timeout=max(deadline - time.monotonic(), 0)))
+                except queue.Empty:
+                    break
+            try:
+                with conn:
+                    for write, args in batch:
+                        write(conn, *args)
+            except sqlite3.Error:
+                self.dropped_writes += len(batch)
+                logger.exception("Session store: dropped %d writes", len(batch))
+            finally:
+                for _ in batch:
+                    self.pending.task_done()
+
+    # Wait until every queued write has been committed
+    def flush(self):
+        self.pending.join()
+
+    def open_session(self, app, config):
+        session_id = uuid.uuid4().hex
+        self.pending.put((_open_session, (session_id, app, config_key(app, config), time.time())))
+        return session_id
+
+    def append_round(self, session_id, round_number, row, profit, won):
+        self.pending.put((_append_round, (session_id, int(round_number), row, float(profit), bool(won), time.time())))
+
+    def end_session(self, session_id, status):
+        self.pending.put((_end_session, (session_id, status, time.time())))
+
+    # Configuration and logged rows of an unfinished session, or None
+    def load_session(self, session_id, app):
+        if not session_id:
+            return None
+        self.flush()
+        with closing(self._connect()) as conn:
+            session = conn.execute(
+                "SELECT config FROM sessions WHERE id = ? AND app = ? AND ended_at IS NULL", (session_id, app)
+            ).fetchone()
+            if session is None:
+                return None
+            rows = conn.execute("SELECT row FROM rounds WHERE session_id = ? ORDER BY round", (session_id,))
+            config = json.loads(session[0])
+            config.pop('app')
+            return config, [json.loads(row) for (row,) in rows]
+
+    # Materialized stats per strategy configuration, one row each with the config expanded.
+    # Reads what has been committed so far, without waiting for queued writes.
+    def strategy_stats(self, app=None):
+        with closing(self._connect()) as conn:
+            query = "SELECT * FROM strategy_stats" + (" WHERE app = ?" if app else "")
+            stats = pd.read_sql(query, conn, params=(app,) if app else None)
+        configs = pd.DataFrame([json.loads(config) for config in stats['config']], index=stats.index)
+        stats = pd.concat([configs.drop(columns='app', errors='ignore'), stats.drop(columns='config')], axis=1)
+        stats['bust_rate'] = stats['busts'] / stats['finished'].where(stats['finished'] > 0)
+        stats['mean_pnl'] = stats['finished_pnl'] / stats['finished'].where(stats['finished'] > 0)
+        return stats
+
+
+def _json_value(value):
+    return value.item() if hasattr(value, 'item') else str(value)
+
+
+def _open_session(conn, session_id, app, config, started_at):
+    conn.execute("INSERT INTO sessions (id, app, config, started_at) VALUES (?, ?, ?, ?)",
+                 (session_id, app, config, started_at))
+    conn.execute("INSERT INTO strategy_stats (config, app, sessions) VALUES (?, ?, 1) "
+                 "ON CONFLICT (config) DO UPDATE SET sessions = sessions + 1", (config, app))
+
+
+def _append_round(conn, session_id, round_number, row, profit, won, recorded_at):
+    cursor = conn.execute(
+        "INSERT OR IGNORE INTO rounds (session_id, round, profit, won, row, recorded_at) VALUES (?, ?, ?, ?, ?, ?)",
+        (session_id, round_number, profit, int(won), json.dumps(row, default=_json_value), recorded_at),
+    )
+    if cursor.rowcount:
+        conn.execute(
+            "UPDATE strategy_stats SET rounds = rounds + 1, wins = wins + ?, total_profit = total_profit + ? "
+            "WHERE config = (SELECT config FROM sessions WHERE id = ?)",
+            (int(won), profit, session_id),
+        )
+
+
+def _end_session(conn, session_id, status, ended_at):
+    cursor = conn.execute(
+        "UPDATE sessions SET ended_at = ?, status = ?, "
+        "rounds = (SELECT COUNT(*) FROM rounds WHERE session_id = sessions.id), "
+        "pnl = (SELECT COALESCE(SUM(profit), 0) FROM rounds WHERE session_id = sessions.id) "
+        "WHERE id = ? AND ended_at IS NULL",
+        (ended_at, status, session_id),
+    )
+    if cursor.rowcount:
+        conn.execute(
+            "UPDATE strategy_stats SET finished = finished + 1, targets = targets + ?, busts = busts + ?, "
+            "finished_pnl = finished_pnl + (SELECT pnl FROM sessions WHERE id = ?) "
+            "WHERE config = (SELECT config FROM sessions WHERE id = ?)",
+            (int(status == TARGET), int(status == BUST), session_id, session_id),
+        )
@@ -0,0 +1,138 @@
+import hashlib
+import json
+import os
+import shutil
+import uuid
+
+import numpy as np
+import pandas as pd
+
+import countries
+import rollup
+from trade_index import INDEXED_COLUMNS, TradeIndex
+
+# Published copies live under the dataset root; the underscore keeps pyarrow from reading them
+SHARED_DIR = '_shared'
+# Bump when the published layout changes so stale copies are rebuilt
+SHARED_VERSION = 3
+META_NAME = 'meta.json'
+
+
+# Identifies one build of the dataset. Every build (full, incremental or converted) rewrites
+# the HS2 rollup file of each year it touches and removes those of dropped years, so the
+# files' names, sizes and mtimes change whenever the data does, and checking them costs one
+# stat call per year however many partitions there are.
+def build_key(root):
+    digest = hashlib.sha256(str(SHARED_VERSION).encode())
+    directory = rollup.hs2_dir(root)
+    names = sorted(name for name in os.listdir(directory) if name.endswith('.parquet')) if os.path.isdir(directory) else []
+    for name in names:
+        stat = os.stat(os.path.join(directory, name))
+        digest.update(f"{name}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode())
+    return digest.hexdigest()[:16]
+
+
+# One copy per dataset build and selection (HS2 codes and exporter/importer lists)
+def dataset_key(root, need_hs, exporters=None, importers=None):
+    selection = json.dumps([sorted(need_hs), countries.as_list(exporters), countries.as_list(importers)])
+    return build_key(root) + '-' + hashlib.sha256(selection.encode()).hexdigest()[:16]
+
+
+def shared_dir(root, need_hs, exporters=None, importers=None):
+    return os.path.join(root, SHARED_DIR, dataset_key(root, need_hs, exporters, importers))
+
+
+# Write the frame, the HS lookups and the row index as flat .npy files plus a small JSON
+# description. Categorical columns are stored as their integer codes.
+# Files go to a scratch directory that is renamed into place, so a reader never sees a
+# half-written copy; when another process published first, its copy is kept.
+def publish(directory, df, lookups, index):
+    parent = os.path.dirname(directory)
+    os.makedirs(parent, exist_ok=True)
+    scratch = os.path.join(parent, f'.tmp-{uuid.uuid4().hex}')
+    os.makedirs(scratch)
+    try:
+        columns = []
+        for i, name in enumerate(df.columns):
+            values = df[name].array
+            entry = {'name': name, 'file': f'column-{i}.npy'}
+            if isinstance(df[name].dtype, pd.CategoricalDtype):
+                entry['categories'] = [str(category) for category in values.categories]
+                values = values.codes
+            np.save(os.path.join(scratch, entry['file']), np.asarray(values))
+            columns.append(entry)
+
+        # Positions for each indexed column are stored back to back, with each key's slice
+        # given by `offsets`
+        positions = {}
+        for column in INDEXED_COLUMNS:
+            keys = list(index.positions[column])
+            arrays = [index.positions[column][key] for key in keys]
+            offsets = np.cumsum([0] + [len(rows) for rows in arrays]).tolist()
+            entry = {'keys': [key.item() if isinstance(key, np.generic) else key for key in keys],
+                     'offsets': offsets, 'file': f'index-{column}.npy'}
+            rows = np.concatenate(arrays) if arrays else np.empty(0, dtype=np.int32)
+            np.save(os.path.join(scratch, entry['file']), rows.astype(np.int32))
+            positions[column] = entry
+
+        meta = {
+            'version': SHARED_VERSION,
+            'rows': len(df),
+            'columns': columns,
+            'lookups': {code: lookup.to_dict() for code, lookup in lookups.items()},
+            'positions': positions,
+        }
+        with open(os.path.join(scratch, META_NAME), 'w', encoding='utf-8') as handle:
+            json.dump(meta, handle)
+
+        try:
+            os.rename(scratch, directory)
+        except OSError:
+            if not os.path.exists(os.path.join(directory, META_NAME)):
+                raise
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    # Copies of older builds are no longer used by new workers. Workers still mapping them keep
+    # their pages; where the OS refuses to delete mapped files they are left for a later run.
+    build = os.path.basename(directory).split('-')[0]
+    for name in os.listdir(parent):
+        if not name.startswith(('.tmp-', build + '-')):
+            shutil.rmtree(os.path.join(parent, name), ignore_errors=True)
+
+
+# A read-only mapping of one stored array, as a plain ndarray view of the mapped pages
+def load_array(directory, name):
+    return np.load(os.path.join(directory, name), mmap_mode='r').view(np.ndarray)
+
+
+# Map a published copy read-only. Columns and index positions are views of the mapped files,
+# so every process attached to the same copy shares one set of pages in the OS page cache.
+# Returns (df, lookups, index), or None when nothing has been published at `directory`.
+def attach(directory):
+    try:
+        with open(os.path.join(directory, META_NAME), encoding='utf-8') as handle:
+            meta = json.load(handle)
+    except (OSError, ValueError):
+        return None
+    if meta.get('version') != SHARED_VERSION:
+        return None
+
+    data = {}
+    for entry in meta['columns']:
+        values = load_array(directory, entry['file'])
+        if 'categories' in entry:
+            dtype = pd.CategoricalDtype(entry['categories'])
+            values = pd.Categorical.from_codes(values, dtype=dtype, validate=False)
+        data[entry['name']] = pd.Series(values, copy=False)
+    df = pd.DataFrame(data, copy=False)
+
+    lookups = {code: pd.Series(lookup) for code, lookup in meta['lookups'].items()}
+
+    positions = {}
+    for column, entry in meta['positions'].items():
+        rows = load_array(directory, entry['file'])
+        offsets = entry['offsets']
+        positions[column] = {key: rows[offsets[i]:offsets[i + 1]] for i, key in enumerate(entry['keys'])}
+    index = TradeIndex.from_positions(meta['rows'], positions)
+    return df, lookups, index
@@ -0,0 +1,193 @@
+import io
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+import backtest
+import instrument
+import ledger
+import martingale
+import ruin
+import sweep
+from session_store import SessionStore
+
+
+# Monte Carlo panel shared by copilot.py and simulator.py: runs many sessions of the
+# current settings at once and shows the outcome distribution
+def monte_carlo_panel(wallet, starting_bet, stop_wins, choice, reset_on_win):
+    with st.expander("🎲 Monte Carlo: simulate many sessions"):
+        sessions = st.number_input("Sessions to simulate", min_value=1_000, max_value=5_000_000, value=100_000, step=10_000)
+        bias = st.slider("Chance of Red / big", min_value=0.0, max_value=1.0, value=0.5, step=0.01)
+        seed = st.number_input("Random seed", min_value=0, value=0, step=1)
+
+        if st.button("Run simulation"):
+            result = martingale.simulate(
+                wallet,
+                starting_bet,
+                stop_wins,
+                sessions=int(sessions),
+                win_prob=martingale.choice_win_prob(choice, bias),
+                reset_on_win=reset_on_win,
+                seed=int(seed),
+            )
+            summary = result.summary()
+
+            bust_col, pnl_col, rounds_col = st.columns(3)
+            bust_col.metric("Bust rate", f"{summary['bust_rate']:.2%}")
+            pnl_col.metric("Expected P&L", f"₹{summary['mean_pnl']:,.2f}")
+            rounds_col.metric("Mean rounds to stop", f"{summary['mean_rounds']:.1f}")
+            st.write(f"Median P&L ₹{summary['median_pnl']:,.2f} · 5th–95th percentile "
+                     f"₹{summary['p05_pnl']:,.2f} to ₹{summary['p95_pnl']:,.2f} · "
+                     f"longest session {summary['max_rounds']} rounds")
+
+            counts, edges = np.histogram(result.final_pnl, bins=50)
+            st.bar_chart(pd.DataFrame({"Sessions": counts}, index=pd.Index(np.round(edges[:-1], 2), name="Final P&L")))
+
+
+# Odds for the session in progress, recomputed on every rerun (cached in ruin.analyze).
+# They are exact to the cent unless the wallet had to be bucketed, which the caption reports.
+def exact_odds_panel(wallet, starting_bet, stop_wins, current_bet, wins, reset_on_win, win_prob=0.5):
+    try:
+        with instrument.stage('exact_odds'):
+            odds = ruin.analyze(float(wallet), float(starting_bet), int(stop_wins), win_prob=win_prob,
+                                reset_on_win=reset_on_win, current_bet=float(current_bet), wins=int(wins))
+    except ValueError as error:
+        st.warning(f"Cannot compute odds: {error}")
+        return
+
+    bust_col, pnl_col, rounds_col = st.columns(3)
+    bust_col.metric("Chance of going bust", f"{odds.bust_prob:.2%}")
+    pnl_col.metric("Expected P&L", f"₹{odds.expected_pnl:,.2f}")
+    rounds_col.metric("Expected rounds left", f"{odds.expected_rounds:.1f}")
+    if odds.resolution > 0.01:
+        st.caption(f"Approximate: the wallet is tracked in ₹{odds.resolution:,.2f} steps for this session size, "
+                   f"so bust checks can be off by up to ₹{odds.resolution:,.2f}.")
+
+
+# History table showing the most recent rounds of a ledger
+def ledger_table(rounds, **kwargs):
+    with instrument.stage('ledger_table', rows_in=len(rounds)):
+        st.dataframe(rounds.frame(tail=ledger.DISPLAY_ROWS), **kwargs)
+    if len(rounds) > ledger.DISPLAY_ROWS:
+        st.caption(f"Showing the last {ledger.DISPLAY_ROWS:,} of {len(rounds):,} rounds.")
+
+
+# One session store per server process, shared by every browser session
+@st.cache_resource
+def get_session_store():
+    return SessionStore()
+
+
+# Replay the unfinished session named in the URL (?session=...) into `rounds`, e.g. after a
+# page reload or a worker restart. Returns the stored configuration, or None.
+def resume_session(store, app, rounds):
+    session_id = st.query_params.get('session')
+    resumed = store.load_session(session_id, app)
+    st.session_state.session_id = session_id if resumed else None
+    if resumed is None:
+        return None
+    config, rows = resumed
+    for row in rows:
+        rounds.append(row, record=False)
+    return config
+
+
+# Open a stored session on the first round, keeping its id in the URL so it can be resumed
+def ensure_session(store, app, config):
+    if st.session_state.session_id is None:
+        st.session_state.session_id = store.open_session(app, config)
+        st.query_params['session'] = st.session_state.session_id
+    return st.session_state.session_id
+
+
+def end_session(store, status):
+    if st.session_state.get('session_id') is not None:
+        store.end_session(st.session_state.session_id, status)
+        st.session_state.session_id = None
+        st.query_params.pop('session', None)
+
+
+# Running stats of stored sessions for each strategy configuration of an app
+def stored_sessions_panel(store, app):
+    with st.expander("📚 Stored sessions"):
+        stats = store.strategy_stats(app)
+        if store.dropped_writes:
+            st.warning(f"{store.dropped_writes:,} writes could not be saved and are missing from these totals.")
+        if stats.empty:
+            st.write("No sessions recorded yet.")
+            return
+        st.dataframe(stats, hide_index=True, column_config={
+            "bust_rate": st.column_config.NumberColumn("bust rate", format="percent"),
+            "mean_pnl": st.column_config.NumberColumn("mean P&L", format="%.2f"),
+        })
+
+
+# Parameter sweep over two of multiplier / payout / starting bet / stop-after-wins, with the
+# others taken from the current settings. The heatmaps are redrawn as cells finish.
+def sweep_panel(wallet, starting_bet, stop_wins, reset_on_win):
+    with st.expander("🗺️ Parameter sweep"):
+        current = {'multiplier': martingale.MULTIPLIER, 'payout': martingale.PAYOUT,
+                   'starting_bet': float(starting_bet), 'stop_wins': int(stop_wins)}
+        names = list(sweep.AXES)
+        x_col, y_col = st.columns(2)
+        x = x_col.selectbox("X axis", names, index=0)
+        y = y_col.selectbox("Y axis", [name for name in names if name != x], index=2)
+
+        axes = {}
+        for name, column in [(x, x_col), (y, y_col)]:
+            low = column.number_input(f"{name} from", value=current[name] / 2 if name != 'stop_wins' else 1.0, key=f"sweep_{name}_low")
+            high = column.number_input(f"{name} to", value=current[name] * 2, key=f"sweep_{name}_high")
+            steps = column.number_input(f"{name} steps", min_value=2, max_value=100, value=10, key=f"sweep_{name}_steps")
+            values = np.linspace(low, high, int(steps)).round(6)
+            axes[name] = np.unique(np.round(values)) if name == 'stop_wins' else values
+        sessions = st.number_input("Sessions per cell", min_value=1_000, max_value=1_000_000, value=100_000, step=10_000,
+                                   key="sweep_sessions")
+
+        if st.button("Run sweep"):
+            fixed = {'wallet': float(wallet), 'reset_on_win': reset_on_win, 'sessions': int(sessions), 'seed': 0}
+            fixed.update({name: value for name, value in current.items() if name not in axes})
+            cells = list(sweep.grid(fixed, axes))
+            progress = st.progress(0.0)
+            chart = st.empty()
+            results = []
+            redraw_every = max(1, len(cells) // 20)
+            timing = instrument.stage('sweep', rows_in=len(cells))
+            with timing:
+                for params, summary in sweep.run_sweep(cells):
+                    results.append((params, summary))
+                    if len(results) % redraw_every == 0 or len(results) == len(cells):
+                        progress.progress(len(results) / len(cells), text=f"{len(results)}/{len(cells)} cells")
+                        chart.pyplot(sweep.heatmap(results, x, y))
+                timing.rows_out = len(results)
+
+
+# Replay an uploaded outcome log through several strategies at once and plot their P&L
+def backtest_panel(wallet, starting_bet, stop_wins, choices, reset_on_win):
+    with st.expander("⏪ Backtest on past outcomes"):
+        upload = st.file_uploader("Outcome log (one result per line, e.g. Red/Green or big/small)", type=['txt', 'csv'])
+        multipliers = st.text_input("Multipliers", value=f"{martingale.MULTIPLIER:g}")
+        stops = st.text_input("Stop after wins", value=str(int(stop_wins)))
+        modes = st.multiselect("Choices", choices, default=choices)
+
+        if upload is not None and modes and st.button("Run backtest"):
+            try:
+                strategies = backtest.strategy_grid(
+                    wallet=[float(wallet)],
+                    starting_bet=[float(starting_bet)],
+                    multiplier=backtest.parse_list(multipliers),
+                    stop_wins=backtest.parse_list(stops, int),
+                    reset_on_win=[reset_on_win],
+                    choice=modes,
+                )
+            except ValueError:
+                st.error("Multipliers and stop-after-wins must be comma-separated numbers.")
+                return
+            handle = io.TextIOWrapper(upload, encoding='utf-8', newline='')
+            with instrument.stage('backtest', rows_in=len(strategies)) as timing:
+                result = backtest.backtest(backtest.batched(backtest.encode_outcomes(backtest.read_outcomes(handle))),
+                                           strategies)
+                timing.rows_out = int(result.curves.index[-1])
+            st.line_chart(result.curves)
+            st.dataframe(result.summary[['strategy', 'final_pnl', 'rounds', 'sessions', 'bust', 'max_drawdown']]
+                         .sort_values('final_pnl', ascending=False), hide_index=True)
@@ -115,12 +115,30 @@
 
 #update
 import streamlit as st
-import pandas as pd
 import random
 
+import instrument
+import martingale
+from ledger import RoundLedger
+from session_store import BUST, RESET, TARGET
+from sim_panels import (backtest_panel, end_session, ensure_session, exact_odds_panel, get_session_store, ledger_table,
+                        monte_carlo_panel, resume_session, stored_sessions_panel, sweep_panel)
+
+APP = 'simulator'
+
+LEDGER_COLUMNS = {
+    "Round": "int32",
+    "Bet ₹": "float64",
+    "You Chose": ["Red", "Green"],
+    "Result": ["Red", "Green"],
+    "Win Return ₹": "float64",
+    "Net PnL ₹": "float64",
+    "Won?": ["✅", "❌"],
+}
+
 # Initialize session state
-if 'data' not in st.session_state:
-    st.session_state.data = []
+if 'ledger' not in st.session_state:
+    st.session_state.ledger = RoundLedger(LEDGER_COLUMNS)
 if 'round' not in st.session_state:
     st.session_state.round = 1
 if 'wallet' not in st.session_state:
@@ -140,8 +158,36 @@ if 'stop_after_wins' not in st.session_state:
 if 'started' not in st.session_state:
     st.session_state.started = False
 
+# Every round is recorded in the session store
+store = get_session_store()
+
+
+def record_round(row):
+    store.append_round(st.session_state.session_id, row["Round"], row, row["Win Return ₹"] - row["Bet ₹"],
+                       row["Won?"] == "✅")
+
+
+st.session_state.ledger.sink = record_round
+
+# Pick up an unfinished stored session after a page reload or restart
+if 'session_id' not in st.session_state:
+    config = resume_session(store, APP, st.session_state.ledger)
+    if config is not None:
+        last = st.session_state.ledger.frame().iloc[-1]
+        st.session_state.starting_bet = config['starting_bet']
+        st.session_state.stop_after_wins = config['stop_wins']
+        st.session_state.cumulative_pnl = float(last["Net PnL ₹"])
+        st.session_state.wallet = config['wallet'] + st.session_state.cumulative_pnl
+        st.session_state.wins = int((st.session_state.ledger.frame()["Won?"] == "✅").sum())
+        st.session_state.round = int(last["Round"]) + 1
+        won_last = last["Won?"] == "✅"
+        st.session_state.current_bet = float(last["Bet ₹"]) if won_last else round(float(last["Bet ₹"]) * martingale.MULTIPLIER, 2)
+        st.session_state.last_win_bet = float(last["Bet ₹"]) if won_last else config['starting_bet']
+        st.session_state.started = True
+
 # UI Inputs
 st.title("🎯 Color Bet Strategy")
+instrument.streamlit_start('simulator')
 
 if not st.session_state.started:
     st.session_state.wallet = st.number_input("👜 Wallet Amount ₹", min_value=100.0, value=1000.0)
@@ -158,9 +204,17 @@ if st.button("▶️ Submit Round"):
 
     if st.session_state.wallet < st.session_state.current_bet:
         st.error("💰 Not enough balance in wallet.")
+        end_session(store, BUST)
     elif st.session_state.wins >= st.session_state.stop_after_wins:
         st.success("🎉 You reached your win target!")
     else:
+        ensure_session(store, APP, {
+            'wallet': st.session_state.wallet,
+            'starting_bet': st.session_state.starting_bet,
+            'stop_wins': st.session_state.stop_after_wins,
+            'multiplier': martingale.MULTIPLIER,
+            'payout': martingale.PAYOUT,
+        })
         chosen = random.choice(["Red", "Green"]) if color_choice == "Both" else color_choice
         bet = st.session_state.current_bet
         st.session_state.wallet -= bet
@@ -170,7 +224,7 @@ if st.button("▶️ Submit Round"):
         won = "❌"
 
         if chosen == result_color:
-            win_return = round(bet * 1.98, 2)
+            win_return = round(bet * (1 + martingale.PAYOUT), 2)
             pnl = win_return - bet
             st.session_state.wallet += win_return
             st.session_state.wins += 1
@@ -179,40 +233,57 @@ if st.button("▶️ Submit Round"):
             st.session_state.current_bet = st.session_state.last_win_bet  # keep same for next round
         else:
             pnl = -bet
-            st.session_state.current_bet = round(st.session_state.current_bet * 2.25, 2)  # multiply after loss
+            st.session_state.current_bet = round(st.session_state.current_bet * martingale.MULTIPLIER, 2)  # multiply after loss
 
         st.session_state.cumulative_pnl += pnl
-        net_pnl_display = f"{'+' if st.session_state.cumulative_pnl >= 0 else ''}{st.session_state.cumulative_pnl:.2f}"
 
         # Log round data
-        st.session_state.data.append({
-            "Round": st.session_state.round,
-            "Bet ₹": bet,
-            "You Chose": chosen,
-            "Result": result_color,
-            "Win Return ₹": win_return,
-            "Net PnL ₹": net_pnl_display,
-            "Won?": won
-        })
+        with instrument.stage('record_round', rows_in=len(st.session_state.ledger)):
+            st.session_state.ledger.append({
+                "Round": st.session_state.round,
+                "Bet ₹": bet,
+                "You Chose": chosen,
+                "Result": result_color,
+                "Win Return ₹": win_return,
+                "Net PnL ₹": st.session_state.cumulative_pnl,
+                "Won?": won
+            })
 
         st.session_state.round += 1
         st.session_state.started = True
+        if st.session_state.wins >= st.session_state.stop_after_wins:
+            end_session(store, TARGET)
 
 # Show table
-if st.session_state.data:
-    df = pd.DataFrame(st.session_state.data)
+if len(st.session_state.ledger):
     st.subheader("📊 Betting History")
-    st.dataframe(df, use_container_width=True)
+    ledger_table(st.session_state.ledger, width='stretch',
+                 column_config={"Net PnL ₹": st.column_config.NumberColumn(format="%+.2f")})
 
     st.markdown(f"### 💼 Final Wallet: ₹{st.session_state.wallet:.2f}")
     st.markdown(f"### 📈 Net PnL: `{st.session_state.cumulative_pnl:+.2f} ₹`")
     st.markdown(f"### 🏆 Total Wins: {st.session_state.wins}")
 
+# Exact odds from here until the win target or bust
+exact_odds_panel(st.session_state.wallet, st.session_state.starting_bet, st.session_state.stop_after_wins,
+                 st.session_state.current_bet, st.session_state.wins, reset_on_win=False)
+
+# Simulate many sessions with the same settings
+monte_carlo_panel(st.session_state.wallet, st.session_state.starting_bet, st.session_state.stop_after_wins,
+                  color_choice, reset_on_win=False)
+sweep_panel(st.session_state.wallet, st.session_state.starting_bet, st.session_state.stop_after_wins,
+            reset_on_win=False)
+backtest_panel(st.session_state.wallet, st.session_state.starting_bet, st.session_state.stop_after_wins,
+               ["Red", "Green", "Both"], reset_on_win=False)
+stored_sessions_panel(store, APP)
+instrument.streamlit_panel()
+
 # Reset
 if st.button("🔁 Reset All"):
+    end_session(store, RESET)
     for key in list(st.session_state.keys()):
         del st.session_state[key]
-    st.experimental_rerun()
+    st.rerun()
 
 
 
@@ -0,0 +1,172 @@
+import argparse
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import product
+
+import numpy as np
+from matplotlib.figure import Figure
+
+import martingale
+
+# Finished cells are kept here, one JSON file per parameter hash (override with SWEEP_CACHE_DIR)
+CACHE_DIR = os.environ.get('SWEEP_CACHE_DIR', '_sweep_cache')
+# Bump when simulate() changes in a way that invalidates cached results
+CACHE_VERSION = 1
+
+# Sweepable strategy parameters and how their values are normalized
+AXES = {
+    'multiplier': float,
+    'payout': float,
+    'starting_bet': float,
+    'stop_wins': int,
+}
+METRICS = {'bust_rate': "Bust rate", 'mean_pnl': "Expected P&L"}
+
+
+# Every combination of the swept values, each merged into the fixed simulate() arguments
+def grid(fixed, axes):
+    names = list(axes)
+    for values in product(*axes.values()):
+        yield {**fixed, **{name: AXES[name](value) for name, value in zip(names, values)}}
+
+
+def cell_key(params):
+    text = json.dumps({'version': CACHE_VERSION, **params}, sort_keys=True)
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+# Simulate one grid cell. The seed is derived from the cell's parameters, so a cell gives
+# the same result whichever sweep (or worker) runs it.
+def run_cell(params):
+    params = dict(params)
+    seed = params.pop('seed', 0)
+    result = martingale.simulate(**params, seed=[seed, int(cell_key(params)[:16], 16)])
+    return result.summary()
+
+
+def read_cached(cache_dir, params):
+    try:
+        with open(os.path.join(cache_dir, cell_key(params) + '.json'), encoding='utf-8') as handle:
+            return json.load(handle)['summary']
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def write_cached(cache_dir, params, summary):
+    path = os.path.join(cache_dir, cell_key(params) + '.json')
+    with open(path + '.tmp', 'w', encoding='utf-8') as handle:
+        json.dump({'params': params, 'summary': summary}, handle)
+    os.replace(path + '.tmp', path)
+
+
+# Evaluate grid cells across a process pool (or inline for a single worker), yielding
+# (params, summary) pairs as cells finish: cached cells first, then the rest in
+# completion order. Each new result is cached before it is yielded.
+def run_sweep(cells, workers=None, cache_dir=CACHE_DIR):
+    os.makedirs(cache_dir, exist_ok=True)
+    missing = []
+    for params in cells:
+        summary = read_cached(cache_dir, params)
+        if summary is None:
+            missing.append(params)
+        else:
+            yield params, summary
+
+    if workers == 1:
+        for params in missing:
+            summary = run_cell(params)
+            write_cached(cache_dir, params, summary)
+            yield params, summary
+        return
+
+    if missing:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(run_cell, params): params for params in missing}
+            for future in as_completed(futures):
+                params = futures[future]
+                summary = future.result()
+                write_cached(cache_dir, params, summary)
+                yield params, summary
+
+
+# Grid of `metric` over two swept parameters; cells not finished yet are NaN
+def metric_grid(results, x, y, metric):
+    xs = sorted({params[x] for params, _ in results})
+    ys = sorted({params[y] for params, _ in results})
+    values = np.full((len(ys), len(xs)), np.nan)
+    x_pos = {value: i for i, value in enumerate(xs)}
+    y_pos = {value: i for i, value in enumerate(ys)}
+    for params, summary in results:
+        values[y_pos[params[y]], x_pos[params[x]]] = summary[metric]
+    return xs, ys, values
+
+
+# Bust-rate and expected-P&L heatmaps side by side
+def heatmap(results, x, y, metrics=tuple(METRICS)):
+    fig = Figure(figsize=(6 * len(metrics), 5), layout='constrained')
+    for ax, metric in zip(fig.subplots(1, len(metrics), squeeze=False)[0], metrics):
+        xs, ys, values = metric_grid(results, x, y, metric)
+        image = ax.imshow(values, origin='lower', aspect='auto', interpolation='nearest',
+                          cmap='Reds' if metric == 'bust_rate' else 'RdYlGn')
+        if metric == 'mean_pnl':
+            limit = np.nanmax(np.abs(values)) if np.isfinite(values).any() else 1
+            image.set_clim(-limit, limit)
+        fig.colorbar(image, ax=ax)
+        for set_ticks, set_labels, ticks in [(ax.set_xticks, ax.set_xticklabels, xs), (ax.set_yticks, ax.set_yticklabels, ys)]:
+            step = max(1, len(ticks) // 10)
+            set_ticks(range(0, len(ticks), step))
+            set_labels([f"{value:g}" for value in ticks[::step]])
+        ax.set_xlabel(x)
+        ax.set_ylabel(y)
+        ax.set_title(METRICS[metric])
+    return fig
+
+
+# "2.25" -> [2.25]; "1.5:3:50" -> 50 evenly spaced values from 1.5 to 3
+def parse_values(text):
+    if ':' not in text:
+        return [float(text)]
+    start, stop, count = text.split(':')
+    return np.linspace(float(start), float(stop), int(count)).round(6).tolist()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Sweep martingale parameters and plot bust rate / expected P&L. "
+                    "Each parameter takes a value or START:STOP:COUNT; exactly two must be ranges.")
+    parser.add_argument('--multiplier', default=str(martingale.MULTIPLIER))
+    parser.add_argument('--payout', default=str(martingale.PAYOUT), help="net profit per unit staked on a win")
+    parser.add_argument('--starting-bet', default='10')
+    parser.add_argument('--stop-wins', default='5')
+    parser.add_argument('--wallet', type=float, default=25000)
+    parser.add_argument('--win-prob', type=float, default=0.5)
+    parser.add_argument('--keep-bet', action='store_true', help="keep the winning bet (simulator.py) instead of resetting")
+    parser.add_argument('--sessions', type=int, default=100_000, help="sessions simulated per cell")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument('--cache-dir', default=CACHE_DIR)
+    parser.add_argument('--output', default='sweep.png', help="heatmap image path")
+    args = parser.parse_args(argv)
+
+    axes = {name: parse_values(getattr(args, name)) for name in AXES}
+    swept = [name for name, values in axes.items() if len(values) > 1]
+    if len(swept) != 2:
+        parser.error("exactly two parameters must be ranges")
+    fixed = {'wallet': args.wallet, 'win_prob': args.win_prob, 'reset_on_win': not args.keep_bet,
+             'sessions': args.sessions, 'seed': args.seed}
+
+    cells = list(grid(fixed, axes))
+    results = []
+    for params, summary in run_sweep(cells, workers=args.workers, cache_dir=args.cache_dir):
+        results.append((params, summary))
+        print(f"[{len(results)}/{len(cells)}] " + ", ".join(f"{name}={params[name]:g}" for name in swept)
+              + f": bust {summary['bust_rate']:.2%}, P&L {summary['mean_pnl']:,.2f}")
+
+    heatmap(results, *swept).savefig(args.output)
+    print(f"Wrote {args.output}")
+
+
+if __name__ == '__main__':
+    main()
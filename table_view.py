@@ -0,0 +1,31 @@
+import math
+
+import numpy as np
+
+NUMBER_COLUMNS = ['quantity(in metric tons)', 'value(thousands USD)']
+PAGE_SIZES = [100, 500, 1000]
+
+
+def page_count(frame, page_size):
+    return max(1, math.ceil(len(frame) / page_size))
+
+
+# Rows for one 1-based page; positional slicing, so no rows outside the page are touched
+def paginate(frame, page, page_size):
+    start = (page - 1) * page_size
+    return frame.iloc[start:start + page_size]
+
+
+# Format numeric columns with thousands separators.
+# Only meant for the visible page: values are truncated to whole numbers in one numpy
+# pass and missing values become blanks instead of falling through a per-cell try/except.
+def format_numbers(page, columns=NUMBER_COLUMNS):
+    formatted = {}
+    for column in columns:
+        if column not in page.columns:
+            continue
+        values = page[column].to_numpy(dtype='float64', na_value=np.nan)
+        missing = np.isnan(values)
+        whole = np.trunc(np.where(missing, 0, values)).astype('int64')
+        formatted[column] = np.where(missing, '', [f"{value:,}" for value in whole.tolist()])
+    return page.assign(**formatted)
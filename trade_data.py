@@ -0,0 +1,213 @@
+import os
+import shutil
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+import countries
+import rollup
+
+# Partition keys are encoded in the directory layout:
+# <root>/exporter=156/year=2017/part-0.parquet
+PARTITION_SCHEMA = pa.schema([
+    ('exporter', pa.int32()),
+    ('year', pa.int16()),
+])
+PARTITIONING = ds.partitioning(PARTITION_SCHEMA, flavor='hive')
+
+# Columns stored inside each partition file
+FILE_SCHEMA = pa.schema([
+    ('importer', pa.int32()),
+    ('HS2', pa.string()),
+    ('HS4', pa.string()),
+    ('HS6', pa.string()),
+    ('value(thousands USD)', pa.float64()),
+    ('quantity(in metric tons)', pa.float64()),
+    ('HS2_desc', pa.string()),
+    ('HS6_desc', pa.string()),
+])
+# Partition files are sorted by importer, then HS code, and split into small row groups, so
+# the row-group statistics let an importer or HS2 filter skip most of a file
+SORT_KEYS = [('importer', 'ascending'), ('HS2', 'ascending'), ('HS6', 'ascending')]
+ROW_GROUP_SIZE = 16_384
+FILE_NAME = 'part-0.parquet'
+# Rows are collected here (unsorted) until the partition is closed; the leading dot keeps
+# pyarrow from reading it
+UNSORTED_NAME = '.unsorted.parquet'
+
+
+def partition_dir(root, exporter, year):
+    return os.path.join(root, f'exporter={int(exporter)}', f'year={int(year)}')
+
+
+# Writes one year of trade rows into per-exporter Parquet partitions.
+# Chunks are appended one at a time to an unsorted file per exporter; close() sorts each
+# partition into its final file, so memory is bounded by the largest exporter-year rather
+# than the whole year.
+class YearPartitionWriter:
+    def __init__(self, root, year):
+        self.root = root
+        self.year = int(year)
+        self.writers = {}
+
+    def write(self, df):
+        for exporter, part in df.groupby('exporter', sort=True):
+            writer = self.writers.get(exporter)
+            if writer is None:
+                directory = partition_dir(self.root, exporter, self.year)
+                os.makedirs(directory, exist_ok=True)
+                writer = pq.ParquetWriter(os.path.join(directory, UNSORTED_NAME), FILE_SCHEMA)
+                self.writers[exporter] = writer
+            table = pa.Table.from_pandas(part[FILE_SCHEMA.names], schema=FILE_SCHEMA, preserve_index=False)
+            writer.write_table(table)
+
+    def close(self):
+        for exporter, writer in self.writers.items():
+            writer.close()
+            directory = partition_dir(self.root, exporter, self.year)
+            unsorted = os.path.join(directory, UNSORTED_NAME)
+            table = pq.read_table(unsorted).sort_by(SORT_KEYS)
+            pq.write_table(table, os.path.join(directory, FILE_NAME), row_group_size=ROW_GROUP_SIZE)
+            rollup.write_partition_rollup(directory, table)
+            os.remove(unsorted)
+        self.writers = {}
+
+
+# Rebuild the HS2 rollup files of `years` from the partition rollups written with the data.
+# Only the partition rollups of those years are read, one at a time.
+def refresh_rollup(root, years):
+    exporters = sorted(int(name.split('=', 1)[1]) for name in os.listdir(root) if name.startswith('exporter='))
+    for year in sorted({int(year) for year in years}):
+        partitions = [(exporter, os.path.join(partition_dir(root, exporter, year), rollup.PARTITION_ROLLUP))
+                      for exporter in exporters]
+        rollup.write_year(root, year, [(exporter, path) for exporter, path in partitions if os.path.exists(path)])
+
+
+# Replace the dataset directory at `root` with the freshly written `staging` directory
+def swap_directory(staging, root):
+    backup = root + '.old'
+    shutil.rmtree(backup, ignore_errors=True)
+    if os.path.exists(root):
+        os.rename(root, backup)
+    os.rename(staging, root)
+    shutil.rmtree(backup, ignore_errors=True)
+
+
+# Replace single years of the dataset at `root` with those written to `staging`.
+# Each exporter's year=Y directory moves in with one rename; a year an exporter no longer has
+# in `staging` is removed from the dataset.
+# The backup name starts with a dot so pyarrow never reads it as a partition.
+def swap_partitions(staging, root, years):
+    exporters = set()
+    for directory in [staging, root]:
+        if os.path.isdir(directory):
+            exporters.update(name for name in os.listdir(directory) if name.startswith('exporter='))
+    for exporter in sorted(exporters):
+        for year in years:
+            name = f'year={int(year)}'
+            source = os.path.join(staging, exporter, name)
+            target = os.path.join(root, exporter, name)
+            backup = os.path.join(root, exporter, '.old-' + name)
+            shutil.rmtree(backup, ignore_errors=True)
+            if os.path.exists(target):
+                os.rename(target, backup)
+            if os.path.exists(source):
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                os.rename(source, target)
+            shutil.rmtree(backup, ignore_errors=True)
+
+
+def open_dataset(root, files=None):
+    if files is not None:
+        return ds.dataset(files, format='parquet', partitioning=PARTITIONING, partition_base_dir=root)
+    return ds.dataset(root, format='parquet', partitioning=PARTITIONING)
+
+
+# Read the partitioned dataset into pandas.
+# Only `columns` are decoded, and year/exporter selections prune whole partition directories.
+# An importer selection is pruned with the rollup, whose HS2 level records which
+# exporter/year partitions hold each importer, so "all to one importer" only opens those
+# files. Inside a file, importer and HS2 filters skip row groups by their statistics.
+# With `categorical=True` string columns come back dictionary-encoded instead of one
+# Python string per row.
+def read_dataset(root, columns=None, years=None, hs2=None, categorical=False, exporters=None, importers=None):
+    exporters, importers = countries.as_list(exporters), countries.as_list(importers)
+    files = None
+    if importers is not None:
+        files = partition_files(root, years, exporters, importers)
+        if not files:
+            schema = pa.schema(list(PARTITION_SCHEMA) + list(FILE_SCHEMA))
+            if columns is not None:
+                schema = pa.schema([schema.field(name) for name in columns])
+            return schema.empty_table().to_pandas(strings_to_categorical=categorical)
+    dataset = open_dataset(root, files)
+
+    conditions = []
+    if years is not None:
+        conditions.append(ds.field('year').isin([int(year) for year in years]))
+    if hs2 is not None:
+        conditions.append(ds.field('HS2').isin(list(hs2)))
+    if exporters is not None:
+        conditions.append(ds.field('exporter').isin(exporters))
+    if importers is not None:
+        conditions.append(ds.field('importer').isin(importers))
+    expression = None
+    for condition in conditions:
+        expression = condition if expression is None else expression & condition
+    table = dataset.to_table(columns=columns, filter=expression)
+    return table.to_pandas(strings_to_categorical=categorical)
+
+
+# (exporter, year) partitions holding any of `importers`, found from the HS2 rollup
+def partitions(root, years=None, exporters=None, importers=None):
+    cube = rollup.read_rollup(root, exporters=exporters, importers=importers, years=years, columns=['year', 'exporter'])
+    return sorted(cube[['exporter', 'year']].drop_duplicates().itertuples(index=False, name=None))
+
+
+# Partition files holding any of `importers`
+def partition_files(root, years=None, exporters=None, importers=None):
+    files = [os.path.join(partition_dir(root, exporter, year), FILE_NAME)
+             for exporter, year in partitions(root, years, exporters, importers)]
+    return [path for path in files if os.path.exists(path)]
+
+
+# HS4 rollup rows for some exporters/importers (lists of codes, or None for all), read one
+# partition at a time from the rollups stored next to the data
+def iter_hs4_rollup(root, exporters=None, importers=None):
+    exporters, importers = countries.as_list(exporters), countries.as_list(importers)
+    filters = [('importer', 'in', importers)] if importers is not None else None
+    for exporter, year in partitions(root, exporters=exporters, importers=importers):
+        path = os.path.join(partition_dir(root, exporter, year), rollup.PARTITION_ROLLUP)
+        if not os.path.exists(path):
+            continue
+        frame = pq.read_table(path, filters=filters).to_pandas()
+        frame.insert(0, 'exporter', int(exporter))
+        frame.insert(0, 'year', int(year))
+        yield frame
+
+
+# Split HS descriptions out of the frame into per-code lookup tables.
+# Rows keep only categorical code columns; descriptions live once per code.
+def encode_frame(df):
+    lookups = {}
+    for code, desc in [('HS2', 'HS2_desc'), ('HS6', 'HS6_desc')]:
+        pairs = df[[code, desc]].dropna().drop_duplicates(code)
+        lookups[code] = pd.Series(pairs[desc].astype(str).to_numpy(), index=pairs[code].astype(str).to_numpy()).sort_index()
+    df = df.drop(columns=['HS2_desc', 'HS6_desc'])
+    for code in ['HS2', 'HS4', 'HS6']:
+        if code in df.columns and not isinstance(df[code].dtype, pd.CategoricalDtype):
+            df[code] = df[code].astype('category')
+    return df, lookups
+
+
+# Attach description columns to a (small) frame from the lookup tables.
+# Mapping a categorical only touches its categories, not every row.
+def add_descriptions(df, lookups):
+    columns = {}
+    if 'HS2' in df.columns:
+        columns['HS2_desc'] = df['HS2'].map(lookups['HS2'])
+    if 'HS6' in df.columns:
+        columns['HS6_desc'] = df['HS6'].map(lookups['HS6'])
+    return df.assign(**columns)
@@ -0,0 +1,118 @@
+import numpy as np
+
+import countries
+import hs_search
+import instrument
+import rollup
+import shared_data
+import trade_data
+import trade_export
+from trade_index import TradeIndex
+
+# Columns the explorer shows
+DATA_COLUMNS = ['year', 'exporter', 'importer', 'HS2', 'HS4', 'HS6', 'value(thousands USD)', 'quantity(in metric tons)',
+                'HS2_desc', 'HS6_desc']
+SORT_ORDERS = ['All Data', 'Top N (nlargest)', 'Bottom N (nsmallest)']
+
+
+# Data behind Trade_app.py, kept free of Streamlit so it can be cached there and timed by bench.py.
+# `exporters`/`importers` are lists of BACI codes (None for every country); only the matching
+# partitions are read.
+@instrument.timed(rows_out=lambda options: len(options['data']))
+def load_data(root, need_hs, exporters=None, importers=None):
+    df, lookups = read_frame(root, need_hs, exporters, importers)
+    return make_options(root, need_hs, exporters, importers, df, lookups, TradeIndex(df))
+
+
+# The same data mapped from the copy published under <root>/_shared (see shared_data.py).
+# The first process to load a dataset build reads the Parquet files and publishes it; every
+# later load, in this process or another, maps the published files without copying them.
+@instrument.timed(rows_out=lambda options: len(options['data']))
+def load_shared(root, need_hs, exporters=None, importers=None):
+    directory = shared_data.shared_dir(root, need_hs, exporters, importers)
+    mapped = shared_data.attach(directory)
+    if mapped is None:
+        df, lookups = read_frame(root, need_hs, exporters, importers)
+        shared_data.publish(directory, df, lookups, TradeIndex(df))
+        mapped = shared_data.attach(directory)
+    return make_options(root, need_hs, exporters, importers, *mapped)
+
+
+# The HS search index written at ingest time, or one built from the loaded descriptions for a
+# dataset built before the index was added
+@instrument.timed()
+def load_search(root, lookups):
+    index = hs_search.HSSearchIndex.load(root)
+    if index is None:
+        index = hs_search.HSSearchIndex.build(lookups['HS2'].to_dict(), lookups['HS6'].to_dict())
+    return index
+
+
+def read_frame(root, need_hs, exporters=None, importers=None):
+    # Codes are stored zero-padded and values as float64, so nothing needs fixing up here;
+    # only the needed columns, country partitions and HS2 row groups are read
+    df = trade_data.read_dataset(root, columns=DATA_COLUMNS, hs2=need_hs, categorical=True,
+                                 exporters=exporters, importers=importers)
+
+    # Keep codes as categoricals and descriptions once per code
+    return trade_data.encode_frame(df)
+
+
+def make_options(root, need_hs, exporters, importers, df, lookups, index):
+    # Precomputed year x country pair x HS2 totals built at ingest time
+    cube = rollup.read_rollup(root, exporters=countries.as_list(exporters), importers=countries.as_list(importers))
+    cube = cube[cube['HS2'].isin(need_hs)]
+
+    # Prepare HS2 display; years and HS2 codes present come from the index keys
+    present = set(index.positions['HS2'])
+    hs2_codes = [code for code in lookups['HS2'].index if code in present]
+    hs2_display = [f"{code} - {lookups['HS2'][code]}" for code in hs2_codes]
+    hs2_mapping = dict(zip(hs2_display, hs2_codes))
+
+    return {
+        "data": df,
+        "lookups": lookups,
+        "rollup": cube,
+        "index": index,
+        "year": sorted(index.positions['year']),
+        "hs2_display": hs2_display,
+        "hs2_mapping": hs2_mapping,
+    }
+
+
+# Filter and sort: returns the selected rows and their HS2 totals
+@instrument.timed(rows_in=lambda options, *args: len(options['data']), rows_out=lambda result: len(result[0]))
+def filter_data(options, selected_years, selected_hs2, selected_hs6, sort_order, top_n):
+    index = options['index']
+
+    # Row positions for the selection come from the prebuilt index
+    positions = index.select(selected_years, selected_hs2, selected_hs6)
+
+    # HS2 totals for the selection come from the rollup, not from a scan of the rows. HS6
+    # selections are narrow, so their totals are summed from the few selected rows instead.
+    df = options['data']
+    if selected_hs6:
+        selected = df.take(positions) if positions is not None else df
+        hs2_totals = selected.groupby('HS2', observed=True)[rollup.VALUE_COLUMNS].sum()
+    else:
+        hs2_totals = rollup.hs2_totals(options['rollup'], selected_years, selected_hs2)
+
+    # Sort based on HS2 totals
+    if sort_order == 'Top N (nlargest)':
+        hs2_totals = hs2_totals.sort_values('value(thousands USD)', ascending=False).head(top_n)
+    elif sort_order == 'Bottom N (nsmallest)':
+        hs2_totals = hs2_totals.sort_values('value(thousands USD)', ascending=True).head(top_n)
+
+    if sort_order != 'All Data':
+        top_rows = index.rows('HS2', hs2_totals.index)
+        positions = top_rows if positions is None else np.intersect1d(positions, top_rows, assume_unique=True)
+
+    filtered_df = df if positions is None else df.take(positions)
+    return filtered_df, hs2_totals
+
+
+# Build the download file for a result set chunk by chunk, with raw numeric values
+@instrument.timed(rows_in=lambda filtered_df, *args: len(filtered_df))
+def export_data(filtered_df, lookups, export_format):
+    chunks = (trade_data.add_descriptions(chunk, lookups) for chunk in trade_export.iter_chunks(filtered_df))
+    return trade_export.export_file(chunks, export_format)
@@ -0,0 +1,74 @@
+import gzip
+import io
+import os
+import tempfile
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+CHUNK_SIZE = 100_000
+
+# Export format -> (file extension, MIME type)
+FORMATS = {
+    'CSV': ('.csv', 'text/csv'),
+    'CSV (gzip)': ('.csv.gz', 'application/gzip'),
+    'Parquet': ('.parquet', 'application/vnd.apache.parquet'),
+}
+
+
+# Split a frame into positional slices without copying it up front
+def iter_chunks(frame, chunksize=CHUNK_SIZE):
+    for start in range(0, len(frame), chunksize):
+        yield frame.iloc[start:start + chunksize]
+
+
+# Write DataFrame chunks to a binary file handle in the requested format.
+# Numbers are written as raw values; nothing is formatted for display.
+def write_chunks(chunks, fmt, handle):
+    if fmt == 'Parquet':
+        writer = None
+        try:
+            for chunk in chunks:
+                table = pa.Table.from_pandas(chunk, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(handle, table.schema)
+                writer.write_table(table.cast(writer.schema))
+        finally:
+            if writer is not None:
+                writer.close()
+        return
+
+    stream = gzip.GzipFile(fileobj=handle, mode='wb') if fmt == 'CSV (gzip)' else handle
+    text = io.TextIOWrapper(stream, encoding='utf-8', newline='')
+    try:
+        header = True
+        for chunk in chunks:
+            chunk.to_csv(text, header=header, index=False)
+            header = False
+    finally:
+        # Detach so closing the wrapper does not close the caller's handle
+        text.flush()
+        text.detach()
+        if stream is not handle:
+            stream.close()
+
+
+# Write chunks to an anonymous temporary file and return it rewound for reading.
+# st.download_button accepts a BufferedReader but not the BufferedRandom TemporaryFile
+# returns, so the file is reopened read-only on a duplicate descriptor, which keeps the
+# deleted file alive until the reader is closed.
+def export_file(chunks, fmt):
+    with tempfile.TemporaryFile() as handle:
+        write_chunks(chunks, fmt, handle)
+        handle.flush()
+        reader = open(os.dup(handle.fileno()), 'rb')
+    reader.seek(0)
+    return reader
+
+
+def file_name(base, fmt):
+    return base + FORMATS[fmt][0]
+
+
+def mime_type(fmt):
+    return FORMATS[fmt][1]
@@ -0,0 +1,42 @@
+import numpy as np
+
+INDEXED_COLUMNS = ['year', 'HS2', 'HS6']
+
+
+# Inverted index over the trade frame.
+# Every year, HS2 and HS6 value maps to the sorted row positions holding it, so a
+# selection is a union of position arrays per column and an intersection across columns.
+class TradeIndex:
+    def __init__(self, df):
+        self.size = len(df)
+        self.positions = {}
+        for column in INDEXED_COLUMNS:
+            groups = df.groupby(column, observed=True, sort=True).indices
+            self.positions[column] = {key: np.asarray(rows, dtype=np.int32) for key, rows in groups.items()}
+
+    # Rebuild an index from stored parts (see shared_data.py) without scanning the frame
+    @classmethod
+    def from_positions(cls, size, positions):
+        index = cls.__new__(cls)
+        index.size = size
+        index.positions = positions
+        return index
+
+    # Row positions matching any of `values` in `column`
+    def rows(self, column, values):
+        index = self.positions[column]
+        arrays = [index[value] for value in values if value in index]
+        if not arrays:
+            return np.empty(0, dtype=np.int32)
+        if len(arrays) == 1:
+            return arrays[0]
+        return np.sort(np.concatenate(arrays))
+
+    # Row positions matching every non-empty selection, or None when nothing is selected
+    def select(self, years=None, hs2=None, hs6=None):
+        selections = [(column, values) for column, values in zip(INDEXED_COLUMNS, [years, hs2, hs6]) if values]
+        result = None
+        # Start from the smallest selection so each intersection is as cheap as possible
+        for rows in sorted((self.rows(column, values) for column, values in selections), key=len):
+            result = rows if result is None else np.intersect1d(result, rows, assume_unique=True)
+        return result